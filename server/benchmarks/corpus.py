@@ -0,0 +1,126 @@
+import os
+import random
+from dataclasses import dataclass, field
+
+# Mots utilisés pour générer le texte des pages
+VOCABULARY = (
+    "moteur piston vanne pompe capteur joint filtre courroie turbine compresseur circuit "
+    "tension pression température débit réglage maintenance contrôle sécurité procédure "
+    "installation démontage remplacement vérification nettoyage lubrification inspection "
+    "garantie fournisseur référence modèle série version fiche notice manuel chapitre annexe "
+    "client commande livraison facture devis contrat délai tarif remise paiement stock"
+).split()
+
+# Nombre de caractères par ligne et de lignes par page du PDF généré
+LINE_LENGTH = 90
+LINES_PER_PAGE = 64
+
+
+@dataclass
+class Corpus:
+    """
+    Corpus synthétique : fichiers PDF générés et questions portant sur leur contenu.
+    """
+
+    files: list[str] = field(default_factory=list)
+    queries: list[str] = field(default_factory=list)
+
+
+def build_corpus(directory: str, files: int, pages: int, words_per_page: int, queries: int, seed: int = 0):
+    """
+    Génère un corpus de fichiers PDF déterministe (même graine, même corpus).
+
+    Chaque page contient du texte aléatoire et une référence unique (par exemple "REF-3-12-4821"),
+    ce qui permet de poser des questions portant sur un identifiant exact.
+
+    :param directory: Dossier où écrire les fichiers.
+    :param files: Nombre de fichiers.
+    :param pages: Nombre de pages par fichier.
+    :param words_per_page: Nombre de mots par page.
+    :param queries: Nombre de questions à générer.
+    :param seed: Graine du générateur aléatoire.
+    :return: Le corpus (Corpus).
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    corpus = Corpus()
+    references = []
+    for file_index in range(files):
+        page_texts = []
+        for page_index in range(pages):
+            reference = f"REF-{file_index}-{page_index}-{rng.randrange(10000):04d}"
+            references.append(reference)
+            words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+            words.insert(rng.randrange(len(words) + 1), reference)
+            page_texts.append(" ".join(words))
+        path = os.path.join(directory, f"document-{file_index:04d}.pdf")
+        write_pdf(path, page_texts)
+        corpus.files.append(path)
+
+    # Une question sur deux porte sur une référence exacte, les autres sur des mots du vocabulaire
+    for query_index in range(queries):
+        if query_index % 2 == 0 and references:
+            corpus.queries.append(f"Que dit la documentation sur la référence {rng.choice(references)} ?")
+        else:
+            words = " ".join(rng.sample(VOCABULARY, 3))
+            corpus.queries.append(f"Quelle est la procédure pour {words} ?")
+    return corpus
+
+
+def write_pdf(path: str, pages: list[str]):
+    """
+    Écrit un fichier PDF minimal (police Helvetica, une page par texte), sans dépendance externe.
+
+    :param path: Chemin du fichier.
+    :param pages: Texte de chaque page (tronqué s'il ne tient pas sur la page).
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        page_number = len(objects) + 1
+        kids.append(f"{page_number} 0 R")
+        lines = _wrap(text)[:LINES_PER_PAGE]
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        content = stream.encode("latin-1", errors="replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_number + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def _wrap(text: str):
+    """
+    :return: Le texte découpé en lignes d'au plus LINE_LENGTH caractères (sans couper les mots).
+    """
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > LINE_LENGTH:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _escape(text: str):
+    """
+    :return: Le texte échappé pour une chaîne PDF.
+    """
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
@@ -0,0 +1,244 @@
+"""
+Modèles factices et déterministes remplaçant Ollama pendant les benchmarks, utilisables
+dans le processus (classes de remplacement d'OllamaEmbeddings et d'OllamaLLM) ou par HTTP
+(serveur local implémentant /api/embed et /api/generate).
+
+Lancement du serveur seul : python -m benchmarks.fake_ollama --port 11500 --embed-ms 20
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+# Dimension des embeddings factices
+DIMENSIONS = 256
+
+# Nombre de tokens des réponses factices
+ANSWER_TOKENS = 32
+
+
+@dataclass
+class Latency:
+    """
+    Latences simulées des modèles, en millisecondes.
+    """
+
+    embed_ms: float = 0.0  # par appel au modèle d'embedding
+    embed_per_text_ms: float = 0.0  # par texte intégré
+    first_token_ms: float = 0.0  # avant le premier token d'une réponse
+    token_ms: float = 0.0  # entre deux tokens
+
+    def sleep_embed(self, count: int):
+        time.sleep((self.embed_ms + self.embed_per_text_ms * count) / 1000)
+
+
+# Latences utilisées par les modèles factices du processus
+LATENCY = Latency()
+
+
+def fake_embedding(text: str):
+    """
+    Calcule un embedding déterministe : les mots du texte sont répartis par hachage sur
+    les dimensions, si bien que des textes partageant des mots ont des embeddings proches.
+
+    :param text: Texte à intégrer.
+    :return: Vecteur normalisé de DIMENSIONS composantes.
+    """
+    vector = [0.0] * DIMENSIONS
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % DIMENSIONS
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def fake_answer(prompt: str):
+    """
+    Génère une réponse déterministe (même prompt, même réponse) découpée en tokens.
+
+    :param prompt: Prompt envoyé au modèle.
+    :return: Liste des tokens de la réponse.
+    """
+    words = re.findall(r"\w+", prompt) or ["réponse"]
+    seed = int.from_bytes(hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest(), "little")
+    return [f" {words[(seed + i * 7919) % len(words)]}" for i in range(ANSWER_TOKENS)]
+
+
+class FakeOllamaEmbeddings(Embeddings):
+    """
+    Remplaçant d'OllamaEmbeddings dans le processus (mêmes paramètres de construction).
+    """
+
+    def __init__(self, model: str, base_url: str | None = None, client_kwargs: dict | None = None):
+        self.model = model
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        LATENCY.sleep_embed(len(texts))
+        return [fake_embedding(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeOllamaLLM(LLM):
+    """
+    Remplaçant d'OllamaLLM dans le processus (mêmes paramètres de construction).
+    """
+
+    model: str
+    base_url: str | None = None
+    client_kwargs: dict | None = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-ollama"
+
+    def _call(self, prompt: str, stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt))
+
+    def _stream(self, prompt: str, stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(LATENCY.first_token_ms / 1000)
+        for i, token in enumerate(fake_answer(prompt)):
+            if i:
+                time.sleep(LATENCY.token_ms / 1000)
+            yield GenerationChunk(text=token)
+
+
+def install_in_process(latency: Latency):
+    """
+    Remplace les modèles Ollama de l'application par les modèles factices.
+    À appeler après `django.setup()` et avant la première utilisation des modèles.
+
+    :param latency: Latences simulées.
+    """
+    from rag import get_embedding_function, resources
+
+    LATENCY.__dict__.update(latency.__dict__)
+    get_embedding_function.OllamaEmbeddings = FakeOllamaEmbeddings
+    resources.OllamaLLM = FakeOllamaLLM
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Implémente les routes de l'API Ollama utilisées par l'application.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = LATENCY
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/embed":
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            self.latency.sleep_embed(len(texts))
+            self._send_json({"model": body["model"], "embeddings": [fake_embedding(text) for text in texts]})
+        elif self.path == "/api/generate":
+            self._stream_generation(body)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def _send_json(self, data: dict):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream_generation(self, body: dict):
+        """
+        Retourne la réponse token par token (lignes JSON envoyées par morceaux HTTP), comme Ollama.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.latency.first_token_ms / 1000)
+        for i, token in enumerate(fake_answer(body.get("prompt", ""))):
+            if i:
+                time.sleep(self.latency.token_ms / 1000)
+            self._write_chunk({"model": body["model"], "response": token, "done": False})
+        self._write_chunk({"model": body["model"], "response": "", "done": True, "done_reason": "stop"})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: dict):
+        line = (json.dumps(data) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+
+class FakeOllamaServer:
+    """
+    Serveur HTTP factice exécuté dans un thread du processus.
+    """
+
+    def __init__(self, latency: Latency, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (FakeOllamaHandler,), {"latency": latency})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    """
+    Ajoute les options de latence simulée à un analyseur d'arguments.
+    """
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="Latence par appel au modèle d'embedding.")
+    parser.add_argument("--embed-per-text-ms", type=float, default=0.0, help="Latence par texte intégré.")
+    parser.add_argument("--first-token-ms", type=float, default=0.0, help="Latence avant le premier token.")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Latence entre deux tokens.")
+
+
+def latency_from_arguments(args: argparse.Namespace):
+    """
+    :return: Les latences (Latency) données par les options de la ligne de commande.
+    """
+    return Latency(args.embed_ms, args.embed_per_text_ms, args.first_token_ms, args.token_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Ollama factice pour les benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(latency_from_arguments(args), args.host, args.port)
+    print(f"🤖 Serveur Ollama factice à l'écoute sur {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Benchmark de l'indexation, des requêtes et des suppressions du RAG, sur un corpus synthétique
+et avec des modèles factices (voir `fake_ollama`).
+
+Exemple (depuis le dossier server/) :
+    python -m benchmarks.run --files 50 --pages 10 --queries 200 --embed-ms 20 --token-ms 5
+    python -m benchmarks.run --model-server http --compare benchmarks/results/precedent.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .fake_ollama import (
+    FakeOllamaServer,
+    add_latency_arguments,
+    install_in_process,
+    latency_from_arguments,
+)
+
+# Dossier par défaut des résultats
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Mesures comparées par --compare (chemin dans les résultats, True si une valeur plus haute est meilleure)
+COMPARED_METRICS = [
+    ("ingest.chunks_per_second", True),
+    ("rebuild.chunks_per_second", True),
+    ("resync.seconds", False),
+    ("query.total_ms.p50", False),
+    ("query.total_ms.p95", False),
+    ("query.first_token_ms.p50", False),
+    ("query.retrieval_ms.p50", False),
+    ("query.queries_per_second", True),
+    ("delete.ms.p50", False),
+    ("memory.max_rss_mb", False),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark du RAG sur un corpus synthétique.")
+    parser.add_argument("--files", type=int, default=20, help="Nombre de fichiers PDF du corpus.")
+    parser.add_argument("--pages", type=int, default=5, help="Nombre de pages par fichier.")
+    parser.add_argument("--words-per-page", type=int, default=300, help="Nombre de mots par page.")
+    parser.add_argument("--queries", type=int, default=50, help="Nombre de questions posées.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Nombre de questions posées simultanément.")
+    parser.add_argument("--delete-files", type=int, default=5, help="Nombre de fichiers supprimés de la base.")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du corpus et des questions.")
+    parser.add_argument(
+        "--model-server", choices=["inprocess", "http"], default="inprocess",
+        help="Modèles factices dans le processus, ou serveur HTTP factice local.",
+    )
+    parser.add_argument("--ollama-url", help="Adresse d'un serveur (factice ou non) déjà lancé, pour --model-server http.")
+    add_latency_arguments(parser)
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="PARAMETRE=VALEUR",
+        help="Modifie un paramètre Django (valeur JSON), par exemple --set VECTOR_STORE_BACKEND='\"numpy\"'.",
+    )
+    parser.add_argument("--work-dir", help="Dossier de travail (temporaire et supprimé à la fin par défaut).")
+    parser.add_argument("--output", help="Fichier de résultats JSON (dans benchmarks/results/ par défaut).")
+    parser.add_argument("--compare", help="Résultats précédents (JSON) à comparer aux nouveaux.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    latency = latency_from_arguments(args)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-benchmark-")
+    os.environ["BENCHMARK_DIR"] = work_dir
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+    server = None
+    if args.model_server == "http":
+        if args.ollama_url is None:
+            server = FakeOllamaServer(latency).start()
+        os.environ["BENCHMARK_OLLAMA_URL"] = args.ollama_url or server.url
+
+    import django
+    django.setup()
+    from django.conf import settings
+
+    for assignment in args.set:
+        name, value = assignment.split("=", 1)
+        setattr(settings, name, json.loads(value))
+    if args.model_server == "inprocess":
+        install_in_process(latency)
+
+    from .corpus import build_corpus
+
+    try:
+        print(f"📄 Génération du corpus ({args.files} fichiers de {args.pages} pages) dans {work_dir}")
+        corpus = build_corpus(
+            settings.DATA_PATH, args.files, args.pages, args.words_per_page, args.queries, args.seed
+        )
+        results = {
+            "commit": get_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                **{key: value for key, value in vars(args).items() if key not in ("output", "compare", "work_dir")},
+                "settings": {
+                    name: getattr(settings, name)
+                    for name in (
+                        "VECTOR_STORE_BACKEND", "RETRIEVAL_MODE", "RERANK_MODE", "CONTEXT_TOKEN_BUDGET",
+                        "EMBEDDING_BATCH_SIZE", "EMBEDDING_MAX_IN_FLIGHT", "PDF_PARSER_WORKERS",
+                    )
+                },
+            },
+        }
+        results["ingest"] = benchmark_ingest()
+        results["resync"] = benchmark_resync()
+        results["rebuild"] = benchmark_rebuild()
+        results["query"] = benchmark_queries(corpus.queries, args.concurrency)
+        results["delete"] = benchmark_delete(corpus.files[:args.delete_files])
+        results["memory"] = {"max_rss_mb": max_rss_mb()}
+    finally:
+        if server is not None:
+            server.stop()
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'inconnu'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_summary(results)
+    print(f"💾 Résultats enregistrés dans {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), results)
+
+
+def benchmark_ingest():
+    """
+    Mesure l'indexation complète du corpus, base et cache d'embeddings vides.
+    """
+    from rag.populate_database import populate_database
+    from rag.stats import get_collection_stats
+
+    print("⏱️ Indexation du corpus...")
+    start = time.perf_counter()
+    with quiet():
+        files = populate_database()
+    seconds = time.perf_counter() - start
+    chunks = get_collection_stats()["chunks"]
+    return {
+        "files": files,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "files_per_second": round(files / seconds, 2),
+        "chunks_per_second": round(chunks / seconds, 2),
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+def benchmark_resync():
+    """
+    Mesure une synchronisation sans modification (tous les fichiers sont déjà indexés).
+    """
+    from rag.populate_database import populate_database
+
+    start = time.perf_counter()
+    with quiet():
+        populate_database()
+    return {"seconds": round(time.perf_counter() - start, 3)}
+
+
+def benchmark_rebuild():
+    """
+    Mesure la reconstruction complète de la base, le cache d'embeddings étant rempli.
+    """
+    from rag.populate_database import clear_database, populate_database
+    from rag.stats import get_collection_stats
+
+    print("⏱️ Reconstruction de la base...")
+    with quiet():
+        clear_database()
+    start = time.perf_counter()
+    with quiet():
+        populate_database()
+    seconds = time.perf_counter() - start
+    chunks = get_collection_stats()["chunks"]
+    return {"seconds": round(seconds, 3), "chunks_per_second": round(chunks / seconds, 2)}
+
+
+def benchmark_queries(queries: list[str], concurrency: int):
+    """
+    Mesure la latence des questions : recherche (jusqu'au retour de `query_rag`),
+    premier token et réponse complète.
+    """
+    from rag.query_data import query_rag
+
+    def ask(query_text: str):
+        start = time.perf_counter()
+        response, _ = query_rag(query_text)
+        retrieval = time.perf_counter()
+        first_token = None
+        for _ in response:
+            if first_token is None:
+                first_token = time.perf_counter()
+        end = time.perf_counter()
+        return (
+            (retrieval - start) * 1000,
+            ((first_token or end) - start) * 1000,
+            (end - start) * 1000,
+        )
+
+    print(f"⏱️ {len(queries)} questions ({concurrency} simultanées)...")
+    start = time.perf_counter()
+    with quiet(), ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(ask, queries))
+    seconds = time.perf_counter() - start
+    return {
+        "count": len(queries),
+        "concurrency": concurrency,
+        "queries_per_second": round(len(queries) / seconds, 2),
+        "retrieval_ms": percentiles([timing[0] for timing in timings]),
+        "first_token_ms": percentiles([timing[1] for timing in timings]),
+        "total_ms": percentiles([timing[2] for timing in timings]),
+    }
+
+
+def benchmark_delete(file_paths: list[str]):
+    """
+    Mesure la suppression des morceaux de quelques fichiers de la base.
+    """
+    from rag.views import delete_file_references
+
+    timings = []
+    with quiet():
+        for file_path in file_paths:
+            start = time.perf_counter()
+            delete_file_references(os.path.basename(file_path))
+            timings.append((time.perf_counter() - start) * 1000)
+    return {"files": len(file_paths), "ms": percentiles(timings)}
+
+
+def percentiles(values: list[float]):
+    """
+    :return: Moyenne, minimum, maximum et percentiles (50, 90, 95, 99) des valeurs, arrondis.
+    """
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+    return {
+        "mean": round(statistics.fmean(values), 3),
+        "min": round(values[0], 3),
+        "p50": round(percentile(50), 3),
+        "p90": round(percentile(90), 3),
+        "p95": round(percentile(95), 3),
+        "p99": round(percentile(99), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def max_rss_mb():
+    """
+    :return: Mémoire résidente maximale du processus depuis son lancement (en Mo), ou None si inconnue.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux exprime la valeur en kilo-octets, macOS en octets
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def get_commit():
+    """
+    :return: Identifiant court du commit courant (suffixé de "-dirty" si l'arbre est modifié), ou None.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Masque les messages de l'application pendant les mesures.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def get_metric(results: dict, path: str):
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def print_summary(results: dict):
+    print(f"📊 Résultats (commit {results['commit']})")
+    for path, _ in COMPARED_METRICS:
+        print(f"   {path:<28} {get_metric(results, path)}")
+
+
+def print_comparison(previous: dict, current: dict):
+    print(f"📊 Comparaison avec le commit {previous.get('commit')}")
+    for path, higher_is_better in COMPARED_METRICS:
+        before, after = get_metric(previous, path), get_metric(current, path)
+        if not before or after is None:
+            print(f"   {path:<28} {before} -> {after}")
+            continue
+        change = (after - before) / before * 100
+        better = change > 0 if higher_is_better else change < 0
+        marker = "✅" if better else ("⚠️" if abs(change) >= 5 else "  ")
+        print(f"   {path:<28} {before} -> {after} ({change:+.1f} %) {marker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Paramètres Django des benchmarks : ceux de l'application, avec des données, une base
+et des caches isolés dans un dossier de travail (variable d'environnement BENCHMARK_DIR).
+"""
+import os
+
+from server.settings import *  # noqa: F401,F403
+from server.settings import BASE_DIR, OLLAMA_BASE_URL
+
+# Dossier de travail du benchmark (corpus, base et caches)
+BENCHMARK_DIR = os.environ.get("BENCHMARK_DIR", str(BASE_DIR / "benchmarks" / "work"))
+
+CHROMA_PATH = os.path.join(BENCHMARK_DIR, "chroma_db")
+DATA_PATH = os.path.join(BENCHMARK_DIR, "data")
+COLLECTIONS_PATH = os.path.join(BENCHMARK_DIR, "collections")
+EMBEDDING_CACHE_PATH = os.path.join(BENCHMARK_DIR, "embedding_cache", "embeddings.sqlite3")
+STARTUP_LOCK_PATH = os.path.join(BENCHMARK_DIR, ".startup_ingestion.lock")
+
+# Le benchmark lance lui-même l'indexation, et mesure les requêtes sans le cache de réponses
+STARTUP_INGESTION_MODE = "off"
+ANSWER_CACHE_MAX_ENTRIES = 0
+
+# Adresse du serveur de modèles factice, lorsqu'il est utilisé par HTTP
+OLLAMA_BASE_URL = os.environ.get("BENCHMARK_OLLAMA_URL") or OLLAMA_BASE_URL
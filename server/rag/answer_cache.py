@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import count
+
+import numpy as np
+from django.conf import settings
+
+
+@dataclass
+class CachedAnswer:
+    """
+    Réponse mise en cache, avec l'embedding normalisé de la question et les morceaux utilisés.
+    """
+
+    embedding: np.ndarray
+    chunk_ids: frozenset
+    response: list[str]
+    sources: list[str]
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class AnswerCache:
+    """
+    Cache sémantique des réponses du RAG, pour les questions répétées ou quasi identiques.
+
+    Une réponse est réutilisée si la question est suffisamment proche (similarité cosinus
+    des embeddings au-dessus du seuil) et si la recherche a retourné exactement les mêmes
+    morceaux. Les réponses qui s'appuient sur des morceaux supprimés ou réindexés sont oubliées.
+    Le cache est borné (éviction des moins récemment utilisées) et les entrées expirent.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # clé -> CachedAnswer, de la moins à la plus récemment utilisée
+        self._by_chunk_set = {}  # ensemble de morceaux -> clés des réponses
+        self._by_chunk_id = {}  # morceau -> clés des réponses qui l'utilisent
+        self._keys = count()
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding: list[float], chunk_ids: list[str]):
+        """
+        Recherche une réponse pour une question proche s'appuyant sur les mêmes morceaux.
+
+        :param embedding: Embedding de la question.
+        :param chunk_ids: Identifiants des morceaux retournés par la recherche.
+        :return: La réponse en cache (CachedAnswer), ou None.
+        """
+        query = _normalize(embedding)
+        chunk_set = frozenset(chunk_ids)
+        now = time.monotonic()
+        with self._lock:
+            for key in list(self._by_chunk_set.get(chunk_set, ())):
+                entry = self._entries[key]
+                if now - entry.created_at > self.ttl:
+                    self._remove(key)
+                elif float(np.dot(entry.embedding, query)) >= self.threshold:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+        return None
+
+    def store(self, embedding: list[float], chunk_ids: list[str], response: list[str], sources: list[str]):
+        """
+        Ajoute une réponse complète au cache.
+
+        :param embedding: Embedding de la question.
+        :param chunk_ids: Identifiants des morceaux utilisés pour la réponse.
+        :param response: Morceaux de la réponse, tels que générés.
+        :param sources: Sources retournées avec la réponse.
+        """
+        entry = CachedAnswer(_normalize(embedding), frozenset(chunk_ids), list(response), list(sources))
+        with self._lock:
+            key = next(self._keys)
+            self._entries[key] = entry
+            self._by_chunk_set.setdefault(entry.chunk_ids, set()).add(key)
+            for chunk_id in entry.chunk_ids:
+                self._by_chunk_id.setdefault(chunk_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_chunks(self, chunk_ids: list[str]):
+        """
+        Oublie les réponses qui s'appuient sur l'un de ces morceaux (supprimés ou réindexés).
+
+        :param chunk_ids: Identifiants des morceaux modifiés.
+        """
+        with self._lock:
+            keys = set()
+            for chunk_id in chunk_ids:
+                keys.update(self._by_chunk_id.get(chunk_id, ()))
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        """
+        Vide complètement le cache (par exemple après la réinitialisation de la base).
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_chunk_set.clear()
+            self._by_chunk_id.clear()
+
+    def stats(self):
+        """
+        :return: Statistiques du cache (succès, échecs, taux de succès, nombre d'entrées).
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _remove(self, key):
+        """
+        Retire une entrée et ses références des index. Doit être appelée avec le verrou acquis.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_chunk_set.get(entry.chunk_ids)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_chunk_set[entry.chunk_ids]
+        for chunk_id in entry.chunk_ids:
+            keys = self._by_chunk_id.get(chunk_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_chunk_id[chunk_id]
+
+
+def _normalize(embedding: list[float]):
+    """
+    :return: L'embedding sous forme de vecteur numpy de norme 1 (pour la similarité cosinus).
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@lru_cache(maxsize=None)
+def get_answer_cache():
+    """
+    Retourne le cache de réponses partagé par le processus.
+
+    :return: Une instance d'AnswerCache, ou None si le cache est désactivé.
+    """
+    if not settings.ANSWER_CACHE_MAX_ENTRIES:
+        return None
+    return AnswerCache(
+        settings.ANSWER_CACHE_MAX_ENTRIES,
+        settings.ANSWER_CACHE_TTL,
+        settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    )
+
+
+def invalidate_answers(chunk_ids: list[str]):
+    """
+    Oublie les réponses en cache qui s'appuient sur ces morceaux.
+
+    :param chunk_ids: Identifiants des morceaux ajoutés, modifiés ou supprimés.
+    """
+    cache = get_answer_cache()
+    if cache is not None and chunk_ids:
+        cache.invalidate_chunks(chunk_ids)
+
+
+def clear_answers():
+    """
+    Vide le cache de réponses.
+    """
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.clear()
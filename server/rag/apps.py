@@ -7,7 +7,8 @@ class RagConfig(AppConfig):
 
     def ready(self):
         """
-        Chargement des documents dans la base de données au démarrage de l'application.
+        Synchronisation des documents avec la base de données au démarrage de l'application
+        (en arrière-plan par défaut, voir `STARTUP_INGESTION_MODE`).
         """
-        from .populate_database import populate_database
-        populate_database()
\ No newline at end of file
+        from .startup import start_reconciliation
+        start_reconciliation()
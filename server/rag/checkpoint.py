@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+from .collection import Collection
+
+# Nom du fichier de point de reprise, stocké dans le dossier de l'index de la collection
+CHECKPOINT_FILENAME = "ingest_checkpoint.json"
+
+
+class IngestionCheckpoint:
+    """
+    Point de reprise d'une indexation en masse (`manage.py ingest`).
+
+    On conserve les sources demandées et les fichiers déjà traités : une indexation interrompue
+    et relancée avec les mêmes sources reprend là où elle s'était arrêtée, sans réexaminer
+    les fichiers terminés. Le point de reprise est supprimé une fois l'indexation terminée.
+    """
+
+    def __init__(self, path: str, sources: list[str]):
+        self.path = path
+        self.sources = list(sources)
+        self.done = set()
+        self.started_at = time.time()
+
+    @classmethod
+    def load(cls, collection: Collection, sources: list[str]):
+        """
+        Charge le point de reprise d'une collection s'il correspond aux mêmes sources,
+        sinon en crée un nouveau.
+
+        :param collection: Collection indexée.
+        :param sources: Sources de l'indexation (dossiers, fichiers ou motifs glob).
+        :return: L'instance d'IngestionCheckpoint.
+        """
+        checkpoint = cls(os.path.join(collection.index_path, CHECKPOINT_FILENAME), sources)
+        if os.path.exists(checkpoint.path):
+            with open(checkpoint.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("sources") == checkpoint.sources:
+                checkpoint.done = set(data.get("done", []))
+                checkpoint.started_at = data.get("started_at", checkpoint.started_at)
+        return checkpoint
+
+    def save(self):
+        """
+        Enregistre le point de reprise sur le disque de manière atomique
+        (écriture dans un fichier temporaire puis renommage).
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources, "started_at": self.started_at, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """
+        Supprime le point de reprise (indexation terminée ou recommencée).
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.done = set()
@@ -0,0 +1,394 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .index_versions import (
+    INITIAL_VERSION,
+    VersionLease,
+    collect_garbage,
+    create_version,
+    ensure_current,
+    publish_version,
+    read_building,
+    read_current,
+    version_path,
+)
+from .lexical_index import LEXICAL_INDEX_FILENAME, LexicalIndex, rebuild_lexical_index
+from .resources import create_vector_store, get_shared_embedding_function
+
+# Noms de collection autorisés : ils servent de nom de dossier
+COLLECTION_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Dossiers d'une collection, dans COLLECTIONS_PATH/<nom>/
+COLLECTION_DATA_DIRNAME = "data"
+COLLECTION_INDEX_DIRNAME = "chroma_db"
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+# Versions de l'index utilisées par le traitement en cours, par collection (voir `Collection.use`)
+_leased_versions = ContextVar("leased_versions", default={})
+
+
+class Collection:
+    """
+    Collection de documents nommée (par exemple une par équipe), avec son propre répertoire
+    de données et son propre index (base vectorielle, index lexical, manifeste et statistiques).
+
+    L'index est versionné : le dossier racine (`root_path`) contient un dossier par version et un
+    pointeur `CURRENT` vers la version en service (voir `index_versions`). Une réinitialisation ou
+    une reconstruction écrit une nouvelle version puis la publie d'un coup ; les traitements en
+    cours terminent sur la version avec laquelle ils ont commencé, et les anciennes versions sont
+    supprimées une fois que plus aucun processus ne les utilise.
+
+    La base vectorielle et l'index lexical sont ouverts au premier accès et refermés par
+    `evict_idle_collections` lorsque la collection n'a pas servi depuis un moment. Tout
+    traitement qui utilise ces ressources doit le faire dans un bloc `with collection.use():`
+    pour qu'elles ne soient pas refermées entre-temps.
+
+    Une collection peut aussi être fixée sur une version (`version`), par exemple pour construire
+    une nouvelle version avant de la publier (voir `new_version`).
+    """
+
+    def __init__(self, name: str, data_path: str, root_path: str, version: str | None = None):
+        self.name = name
+        self.data_path = data_path
+        self.root_path = root_path
+        self.version = version
+        self.last_used = time.monotonic()
+        self._open_versions = {}
+        self._version_users = {}
+        self._users = 0
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        if self.version is not None:
+            return f"Collection({self.name!r}, version={self.version!r})"
+        return f"Collection({self.name!r})"
+
+    @property
+    def index_path(self):
+        """
+        Dossier de la version de l'index utilisée : celle du traitement en cours (voir `use`),
+        sinon celle en service.
+        """
+        version = self.get_active_version()
+        return version_path(self.root_path, INITIAL_VERSION if version is None else version)
+
+    def get_active_version(self):
+        """
+        :return: Version de l'index utilisée par le traitement en cours (voir `use`), sinon la version
+                 en service, ou None si l'index n'a pas encore été créé.
+        """
+        if self.version is not None:
+            return self.version
+        leased = _leased_versions.get()
+        if leased.get(self) is not None:
+            return leased[self]
+        return read_current(self.root_path)
+
+    @contextmanager
+    def use(self):
+        """
+        Marque la collection comme utilisée pendant le bloc : ses ressources ne sont pas refermées,
+        et la version de l'index en service au début du bloc reste utilisée jusqu'à sa fin, même si
+        une nouvelle version est publiée entre-temps.
+        """
+        leased = _leased_versions.get()
+        version = self.get_active_version()
+        token = _leased_versions.set({**leased, self: version})
+        with self._lock:
+            self._users += 1
+            self._version_users[version] = self._version_users.get(version, 0) + 1
+            self.last_used = time.monotonic()
+        try:
+            yield self
+        finally:
+            _leased_versions.reset(token)
+            with self._lock:
+                self._users -= 1
+                self._version_users[version] -= 1
+                if not self._version_users[version]:
+                    del self._version_users[version]
+                self.last_used = time.monotonic()
+            self._close_retired_versions()
+
+    def exists(self):
+        """
+        :return: True si l'index de la collection a déjà été créé sur le disque.
+        """
+        if self.version is not None:
+            return os.path.isdir(self.index_path)
+        return read_current(self.root_path) is not None
+
+    def is_open(self):
+        """
+        :return: True si une version de l'index est ouverte.
+        """
+        return bool(self._open_versions)
+
+    def is_idle(self, timeout: float):
+        """
+        :param timeout: Durée d'inactivité (en secondes).
+        :return: True si la collection n'est pas utilisée et n'a pas servi depuis `timeout` secondes.
+        """
+        return self._users == 0 and time.monotonic() - self.last_used >= timeout
+
+    def get_vector_store(self):
+        """
+        Retourne la base vectorielle de la version utilisée de l'index, selon `VECTOR_STORE_BACKEND`.
+
+        :return: L'instance de ChromaVectorStore ou de NumpyVectorStore (ouverte au premier appel
+                 ou après une fermeture).
+        """
+        embedding_function = get_shared_embedding_function()
+        with self._lock:
+            self.last_used = time.monotonic()
+            opened = self._open_version()
+            if opened.vector_store is None:
+                opened.vector_store = create_vector_store(embedding_function, opened.path)
+            return opened.vector_store
+
+    def get_lexical_index(self):
+        """
+        Retourne l'index lexical (BM25) de la version utilisée de l'index.
+        S'il ne contient pas le même nombre de morceaux que la base vectorielle, il est reconstruit à l'ouverture.
+
+        :return: L'instance de LexicalIndex (ouverte au premier appel ou après une fermeture).
+        """
+        db = self.get_vector_store()
+        with self._lock:
+            opened = self._open_version()
+            if opened.lexical_index is None:
+                index = LexicalIndex(os.path.join(opened.path, LEXICAL_INDEX_FILENAME))
+                if index.count() != db.count():
+                    rebuild_lexical_index(index, db)
+                opened.lexical_index = index
+            return opened.lexical_index
+
+    def close(self):
+        """
+        Ferme toutes les versions ouvertes de l'index : elles seront rouvertes depuis le disque au prochain accès.
+        """
+        with self._lock:
+            for opened in self._open_versions.values():
+                opened.close()
+            self._open_versions.clear()
+
+    def new_version(self, resume: bool = False):
+        """
+        Crée une nouvelle version (vide) de l'index, qui n'est pas en service tant qu'elle n'est pas
+        publiée avec `publish`.
+
+        :param resume: Reprendre la version dont la construction a été interrompue, s'il y en a une.
+        :return: Une collection fixée sur la nouvelle version, à remplir puis à publier.
+        """
+        if resume:
+            building = read_building(self.root_path)
+            if building is not None:
+                lease = VersionLease.acquire(self.root_path, building)
+                if lease is not None:
+                    return self._pinned(building, lease)
+        version, lease = create_version(self.root_path, building=True)
+        return self._pinned(version, lease)
+
+    def lock_current(self):
+        """
+        Réserve la version en service de l'index à ce processus (bail exclusif), pour la modifier
+        sur place hors du serveur : aucun autre processus ne peut l'ouvrir tant qu'elle est réservée.
+
+        :return: Une collection fixée sur la version en service, ou None si un autre processus
+                 (un serveur...) utilise cette version.
+        """
+        version = ensure_current(self.root_path)
+        lease = VersionLease.acquire(self.root_path, version, exclusive=True)
+        if lease is None:
+            return None
+        return self._pinned(version, lease)
+
+    def publish(self, built: "Collection"):
+        """
+        Met en service une version construite avec `new_version`. Les traitements en cours terminent
+        sur l'ancienne version, qui est supprimée dès qu'elle n'est plus utilisée.
+
+        :param built: Collection fixée sur la version à publier.
+        """
+        built.close()
+        publish_version(self.root_path, built.version)
+        print(f"🔁 Version {built.version} de la collection '{self.name}' mise en service")
+        self._close_retired_versions(collect=True)
+
+    def _pinned(self, version: str, lease: VersionLease):
+        """
+        :return: Une collection fixée sur une version, qui détient déjà son bail.
+        """
+        pinned = Collection(self.name, self.data_path, self.root_path, version=version)
+        pinned._open_versions[version] = _OpenVersion(version_path(self.root_path, version), lease)
+        return pinned
+
+    def _open_version(self):
+        """
+        Retourne les ressources de la version utilisée de l'index, en prenant un bail sur elle
+        au premier accès. Doit être appelée avec le verrou de la collection acquis.
+
+        :return: L'instance de _OpenVersion.
+        """
+        version = self.get_active_version()
+        if version is None:
+            version = ensure_current(self.root_path)
+        opened = self._open_versions.get(version)
+        if opened is not None:
+            return opened
+
+        lease = VersionLease.acquire(self.root_path, version)
+        if lease is None and self.version is None:
+            # Version supprimée entre-temps : utiliser celle en service
+            version = ensure_current(self.root_path)
+            opened = self._open_versions.get(version)
+            if opened is not None:
+                return opened
+            lease = VersionLease.acquire(self.root_path, version)
+            if lease is None:
+                # Version en service réservée par une indexation hors serveur (`manage.py ingest`)
+                raise RuntimeError(
+                    f"L'index de la collection '{self.name}' est en cours de modification par une autre commande"
+                )
+        opened = self._open_versions[version] = _OpenVersion(version_path(self.root_path, version), lease)
+        return opened
+
+    def _close_retired_versions(self, collect: bool = False):
+        """
+        Ferme les versions ouvertes qui ne sont plus en service et que plus aucun traitement
+        n'utilise, puis supprime du disque les anciennes versions libérées par tous les processus.
+
+        :param collect: Supprimer les anciennes versions même si aucune version n'a été fermée.
+        """
+        if self.version is not None:
+            return
+        current = read_current(self.root_path)
+        with self._lock:
+            retired = [
+                version for version in self._open_versions
+                if version != current and not self._version_users.get(version)
+            ]
+            for version in retired:
+                self._open_versions.pop(version).close()
+        if retired or collect:
+            removed = [version or "index antérieur aux versions" for version in collect_garbage(self.root_path)]
+            if removed:
+                print(f"🧹 Anciennes versions de la collection '{self.name}' supprimées : {', '.join(removed)}")
+
+
+class _OpenVersion:
+    """
+    Ressources ouvertes d'une version de l'index, et bail du processus sur cette version.
+    """
+
+    def __init__(self, path: str, lease: VersionLease | None):
+        self.path = path
+        self.lease = lease
+        self.vector_store = None
+        self.lexical_index = None
+
+    def close(self):
+        """
+        Ferme la base vectorielle et l'index lexical, puis libère le bail.
+        """
+        if self.vector_store is not None:
+            self.vector_store.close()
+            self.vector_store = None
+        if self.lexical_index is not None:
+            self.lexical_index.close()
+            self.lexical_index = None
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
+
+
+def get_collection(name: str | None = None):
+    """
+    Retourne une collection à partir de son nom. La collection par défaut (`DEFAULT_COLLECTION`)
+    utilise les dossiers `DATA_PATH` et `CHROMA_PATH` ; les autres sont rangées dans `COLLECTIONS_PATH`.
+
+    Les collections inactives sont refermées au passage (voir `evict_idle_collections`).
+
+    :param name: Nom de la collection (collection par défaut si absent ou vide).
+    :return: L'instance de Collection (la même pour un même nom).
+    :raises ValueError: Si le nom n'est pas un nom de collection valide.
+    """
+    name = name or settings.DEFAULT_COLLECTION
+    if not COLLECTION_NAME_PATTERN.match(name):
+        raise ValueError(f"Nom de collection invalide : {name!r}")
+
+    with _collections_lock:
+        collection = _collections.get(name)
+        if collection is None:
+            if name == settings.DEFAULT_COLLECTION:
+                collection = Collection(name, settings.DATA_PATH, settings.CHROMA_PATH)
+            else:
+                root = os.path.join(settings.COLLECTIONS_PATH, name)
+                collection = Collection(
+                    name,
+                    os.path.join(root, COLLECTION_DATA_DIRNAME),
+                    os.path.join(root, COLLECTION_INDEX_DIRNAME),
+                )
+            _collections[name] = collection
+    evict_idle_collections(exclude=collection)
+    return collection
+
+
+def list_collections():
+    """
+    Liste les collections existantes : la collection par défaut et celles présentes dans `COLLECTIONS_PATH`.
+
+    :return: Liste triée des noms de collection.
+    """
+    names = {settings.DEFAULT_COLLECTION}
+    if os.path.isdir(settings.COLLECTIONS_PATH):
+        names.update(
+            name for name in os.listdir(settings.COLLECTIONS_PATH)
+            if COLLECTION_NAME_PATTERN.match(name)
+            and os.path.isdir(os.path.join(settings.COLLECTIONS_PATH, name))
+        )
+    return sorted(names)
+
+
+def evict_idle_collections(exclude: Collection | None = None):
+    """
+    Referme les ressources des collections inutilisées depuis `COLLECTION_IDLE_TIMEOUT` secondes,
+    puis, s'il reste plus de `COLLECTION_MAX_OPEN` collections ouvertes, celles inutilisées depuis
+    le plus longtemps, pour borner la mémoire utilisée.
+
+    :param exclude: Collection à ne pas refermer (celle qui va être utilisée).
+    """
+    with _collections_lock:
+        open_collections = [
+            collection for collection in _collections.values()
+            if collection.is_open() and collection is not exclude
+        ]
+    open_collections.sort(key=lambda collection: collection.last_used)
+    # La collection exclue compte parmi les collections ouvertes
+    excess = len(open_collections) + 1 - settings.COLLECTION_MAX_OPEN
+    for collection in open_collections:
+        timeout = 0 if excess > 0 else settings.COLLECTION_IDLE_TIMEOUT
+        with collection._lock:
+            if not collection.is_idle(timeout):
+                continue
+            collection.close()
+        excess -= 1
+        print(f"💤 Collection '{collection.name}' refermée (inactive)")
+
+
+def close_collections():
+    """
+    Referme les ressources de toutes les collections (par exemple avant de supprimer leurs dossiers).
+    """
+    with _collections_lock:
+        collections = list(_collections.values())
+    for collection in collections:
+        collection.close()
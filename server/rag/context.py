@@ -0,0 +1,128 @@
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:  # Sans tiktoken, le nombre de tokens est estimé à partir du nombre de caractères
+    tiktoken = None
+
+# Séparateur entre les passages du contexte
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Écart maximal (en caractères) entre deux morceaux d'une page pour qu'ils soient fusionnés :
+# le découpage retire les séparateurs (sauts de ligne) entre deux morceaux consécutifs
+MAX_MERGE_GAP = 2
+
+# Nombre moyen de caractères par token, pour l'estimation sans tiktoken
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """
+    :return: L'encodage tiktoken configuré par `CONTEXT_TOKEN_ENCODING`, ou None si tiktoken n'est pas installé.
+    """
+    if tiktoken is None:
+        return None
+    return tiktoken.get_encoding(settings.CONTEXT_TOKEN_ENCODING)
+
+
+def count_tokens(text: str):
+    """
+    Compte (ou, sans tiktoken, estime) le nombre de tokens d'un texte.
+
+    :param text: Texte à mesurer.
+    :return: Nombre de tokens.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int):
+    """
+    Tronque un texte pour qu'il ne dépasse pas un nombre de tokens.
+
+    :param text: Texte à tronquer.
+    :param max_tokens: Nombre maximal de tokens.
+    :return: Le début du texte.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return tokenizer.decode(tokenizer.encode(text)[:max_tokens])
+
+
+def build_context(results, token_budget: int | None = None):
+    """
+    Construit le contexte du prompt à partir des morceaux retournés par la recherche.
+
+    Les morceaux qui se suivent dans une même page (`source:page`) sont fusionnés en un seul
+    passage, sans répéter le texte commun dû au chevauchement du découpage. Les passages sont
+    ensuite ajoutés par ordre de pertinence tant que le budget de tokens le permet.
+
+    :param results: Liste de couples (document, score), du plus au moins pertinent.
+    :param token_budget: Nombre maximal de tokens du contexte (`CONTEXT_TOKEN_BUDGET` par défaut).
+    :return: Le texte du contexte.
+    """
+    if token_budget is None:
+        token_budget = settings.CONTEXT_TOKEN_BUDGET
+
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    passages = []
+    used_tokens = 0
+    for passage in merge_adjacent_chunks([doc for doc, _ in results]):
+        tokens = count_tokens(passage)
+        cost = tokens + (separator_tokens if passages else 0)
+        if used_tokens + cost <= token_budget:
+            passages.append(passage)
+            used_tokens += cost
+        elif not passages:
+            # Le passage le plus pertinent est toujours inclus, au besoin tronqué
+            passages.append(truncate_to_tokens(passage, token_budget))
+            used_tokens = token_budget
+    return CONTEXT_SEPARATOR.join(passages)
+
+
+def merge_adjacent_chunks(documents):
+    """
+    Fusionne les morceaux d'une même page qui se chevauchent ou se touchent.
+
+    :param documents: Morceaux, du plus au moins pertinent.
+    :return: Liste des textes des passages, ordonnés selon leur morceau le plus pertinent.
+    """
+    # Morceaux de chaque page, avec leur rang de pertinence
+    pages = {}
+    for rank, doc in enumerate(documents):
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        pages.setdefault(key, []).append((rank, doc))
+
+    # Un passage est un quadruplet (rang du meilleur morceau, début, fin, texte)
+    passages = []
+    for ranked_docs in pages.values():
+        # Sans position connue dans la page (base indexée avant son ajout), les morceaux ne sont pas fusionnés
+        if any(doc.metadata.get("start_index") is None for _, doc in ranked_docs):
+            passages.extend((rank, None, None, doc.page_content) for rank, doc in ranked_docs)
+            continue
+
+        spans = []
+        for rank, doc in sorted(ranked_docs, key=lambda item: item[1].metadata["start_index"]):
+            start = doc.metadata["start_index"]
+            end = start + len(doc.page_content)
+            if spans and start <= spans[-1][2] + MAX_MERGE_GAP:
+                span_rank, span_start, span_end, text = spans[-1]
+                if start > span_end:
+                    # Morceaux consécutifs : remplacer le séparateur retiré par le découpage
+                    text += "\n" + doc.page_content
+                elif end > span_end:
+                    # Morceaux qui se chevauchent : ne garder que la partie qui dépasse du passage courant
+                    text += doc.page_content[span_end - start:]
+                spans[-1] = (min(span_rank, rank), span_start, max(span_end, end), text)
+            else:
+                spans.append((rank, start, end, doc.page_content))
+        passages.extend(spans)
+
+    passages.sort(key=lambda passage: passage[0])
+    return list(dict.fromkeys(text for _, _, _, text in passages))
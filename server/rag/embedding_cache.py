@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str):
+    """
+    Normalise un texte avant le calcul de sa clé de cache
+    (forme Unicode NFC, espaces consécutifs réduits à un seul).
+
+    :param text: Texte à normaliser.
+    :return: Texte normalisé.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Cache persistant des embeddings, stocké dans une base SQLite.
+
+    Chaque entrée est identifiée par le nom du modèle et l'empreinte du texte normalisé.
+    Le nombre d'entrées est borné : les entrées les moins récemment utilisées sont évincées.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._connection.commit()
+        self._size = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def key(self, text: str):
+        """
+        :param text: Texte à intégrer.
+        :return: Clé de cache du texte pour le modèle courant.
+        """
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]):
+        """
+        Récupère les embeddings présents dans le cache et met à jour leur date d'utilisation.
+
+        :param keys: Clés recherchées.
+        :return: Dictionnaire clé -> embedding pour les clés trouvées.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite limite le nombre de paramètres par requête : on procède par tranches
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._connection.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        """
+        Ajoute des embeddings au cache, puis évince les entrées les plus anciennes si nécessaire.
+
+        :param items: Dictionnaire clé -> embedding.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            # Estimation haute (des entrées peuvent avoir été remplacées), corrigée avant toute éviction
+            self._size += len(items)
+            if self._size > self.max_entries:
+                # Recompter avant d'évincer : d'autres processus peuvent aussi partager le cache
+                self._size = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = self._size - self.max_entries
+                if excess > 0:
+                    self._connection.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+                    self._size -= excess
+            self._connection.commit()
+
+    def stats(self):
+        """
+        :return: Statistiques du cache (succès, échecs, taux de succès, nombre d'entrées).
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Fonction d'embedding qui consulte le cache persistant avant d'appeler le modèle.
+
+    Seuls les textes absents du cache sont envoyés au modèle. Les requêtes et les documents
+    partagent les mêmes entrées : le modèle enveloppé doit donc les intégrer de la même façon,
+    ce qui est le cas d'OllamaEmbeddings.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache.key(text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache.key(text) for text in texts]
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            await asyncio.to_thread(self.cache.put_many, computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    @staticmethod
+    def _missing(texts: list[str], keys: list[str], found: dict):
+        """
+        :return: Dictionnaire clé -> texte des textes absents du cache (sans doublons).
+        """
+        return {key: text for key, text in zip(keys, texts) if key not in found}
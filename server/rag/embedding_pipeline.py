@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from langchain.schema.document import Document
+
+from .answer_cache import invalidate_answers
+from .collection import Collection
+from .metrics import CHUNKS_ADDED, span
+from .stats import update_collection_stats
+
+
+class EmbeddingPipelineError(RuntimeError):
+    """
+    Levée lorsqu'au moins un lot n'a pas pu être intégré malgré les nouvelles tentatives.
+    Les lots réussis ont déjà été enregistrés dans la base.
+    """
+
+
+class EmbeddingPipeline:
+    """
+    Pipeline d'intégration (embedding) par lots des morceaux de texte.
+
+    Les lots sont intégrés en parallèle par un nombre borné de workers, chaque lot en échec
+    est retenté avec un délai croissant, et chaque lot intégré est immédiatement enregistré
+    dans la base de la collection : une interruption ne fait perdre que les lots en cours.
+    Le pipeline doit être utilisé dans un bloc `with collection.use():`.
+
+    Si un objet `progress` est fourni, sa méthode `add_embedded(n)` est appelée après chaque lot.
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        batch_size: int | None = None,
+        max_in_flight: int | None = None,
+        max_retries: int | None = None,
+        retry_backoff: float | None = None,
+        progress=None,
+    ):
+        self.collection = collection
+        self.db = collection.get_vector_store()
+        self.progress = progress
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_in_flight = max_in_flight or settings.EMBEDDING_MAX_IN_FLIGHT
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.EMBEDDING_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+
+        # Statistiques cumulées sur toutes les exécutions du pipeline
+        self.embedded_chunks = 0
+        self.elapsed = 0.0
+
+    def run(self, chunks: list[Document]):
+        """
+        Intègre les morceaux par lots et les enregistre dans la base au fur et à mesure.
+
+        :param chunks: Morceaux à intégrer (leur identifiant doit être dans `metadata["id"]`).
+        :raises EmbeddingPipelineError: Si des lots restent en échec après toutes les tentatives.
+        """
+        batches = [chunks[i:i + self.batch_size] for i in range(0, len(chunks), self.batch_size)]
+        if not batches:
+            return
+
+        start = time.perf_counter()
+        failed_batches = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            pending = {}
+            next_batch = 0
+            while pending or next_batch < len(batches):
+                # Garder au plus `max_in_flight` lots en cours d'intégration
+                while next_batch < len(batches) and len(pending) < self.max_in_flight:
+                    batch = batches[next_batch]
+                    pending[executor.submit(self._embed_with_retry, batch)] = batch
+                    next_batch += 1
+
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    batch = pending.pop(future)
+                    try:
+                        embeddings = future.result()
+                    except Exception as e:
+                        print(f"🚫 Échec de l'intégration d'un lot de {len(batch)} morceaux : {e}")
+                        failed_batches.append(batch)
+                        continue
+
+                    # Point de reprise : le lot est enregistré dès qu'il est intégré
+                    self._commit_batch(batch, embeddings)
+                    done += len(batch)
+                    self.embedded_chunks += len(batch)
+                    if self.progress is not None:
+                        self.progress.add_embedded(len(batch))
+                    print(f"📦 Morceaux intégrés : {done}/{len(chunks)}")
+
+        self.elapsed += time.perf_counter() - start
+        if failed_batches:
+            failed_chunks = sum(len(batch) for batch in failed_batches)
+            raise EmbeddingPipelineError(
+                f"{failed_chunks} morceaux n'ont pas pu être intégrés ({len(failed_batches)} lots en échec)"
+            )
+
+    def report(self):
+        """
+        Affiche le débit d'intégration (morceaux par seconde) des exécutions du pipeline.
+        """
+        if self.embedded_chunks:
+            throughput = self.embedded_chunks / self.elapsed if self.elapsed else float("inf")
+            print(
+                f"⏱️ {self.embedded_chunks} morceaux intégrés en {self.elapsed:.2f} s "
+                f"({throughput:.1f} morceaux/s)"
+            )
+
+    def _embed_with_retry(self, batch: list[Document]):
+        """
+        Calcule les embeddings d'un lot, avec de nouvelles tentatives en cas d'échec.
+
+        :param batch: Lot de morceaux.
+        :return: Liste des embeddings du lot.
+        """
+        texts = [chunk.page_content for chunk in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span("embed_batch"):
+                    return self.db.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"⚠️ Nouvelle tentative d'intégration dans {delay:.1f} s : {e}")
+                time.sleep(delay)
+
+    def _commit_batch(self, batch: list[Document], embeddings: list[list[float]]):
+        """
+        Enregistre un lot de morceaux et leurs embeddings dans la base Chroma.
+
+        :param batch: Lot de morceaux.
+        :param embeddings: Embeddings correspondants.
+        """
+        chunk_ids = [chunk.metadata["id"] for chunk in batch]
+        # Ouvrir l'index lexical avant l'ajout, pour qu'il ne soit pas reconstruit à cause de ce lot
+        lexical_index = self.collection.get_lexical_index()
+        # Seuls les morceaux absents de la base augmentent le nombre de morceaux (les autres sont mis à jour)
+        existing_ids = set(self.db.get(ids=chunk_ids, include=[])["ids"])
+        added_chunks = len(set(chunk_ids) - existing_ids)
+        self.db.upsert(
+            ids=chunk_ids,
+            embeddings=embeddings,
+            documents=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+        )
+        # Tenir l'index lexical à jour avec la base
+        lexical_index.add(
+            chunk_ids,
+            [chunk.page_content for chunk in batch],
+            [chunk.metadata for chunk in batch],
+        )
+        update_collection_stats(chunks=added_chunks, collection=self.collection)
+        CHUNKS_ADDED.inc(len(batch))
+        # Les réponses en cache qui s'appuyaient sur d'anciennes versions de ces morceaux sont périmées
+        invalidate_answers(chunk_ids)
@@ -0,0 +1,120 @@
+import asyncio
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_eventstream import send_event
+
+# Clé de session contenant le canal d'événements de l'utilisateur
+SESSION_CHANNEL_KEY = "chat_channel"
+
+
+def new_channel_token():
+    """
+    Génère un identifiant de canal aléatoire, impossible à deviner par les autres utilisateurs.
+
+    :return: Identifiant du canal.
+    """
+    return secrets.token_urlsafe(16)
+
+
+def get_channel_name(token: str):
+    """
+    :param token: Identifiant du canal (stocké dans la session).
+    :return: Nom complet du canal d'événements de chat.
+    """
+    return f"chat-{token}"
+
+
+async def publish_event(channel_name: str, event_type: str, data: dict):
+    """
+    Publie un événement serveur depuis du code asynchrone.
+    `send_event` étant synchrone, il est exécuté hors de la boucle d'événements.
+    """
+    await sync_to_async(send_event, thread_sensitive=False)(channel_name, event_type, data)
+
+
+class CoalescingPublisher:
+    """
+    Regroupe les tokens générés avant de les publier sur un canal d'événements.
+
+    Le tampon est envoyé dès qu'il atteint `flush_chars` caractères, ou au plus tard
+    `flush_interval` secondes après le premier token en attente. Cela évite un événement
+    par token tout en gardant un affichage fluide.
+    """
+
+    def __init__(self, channel_name: str, flush_interval: float | None = None, flush_chars: int | None = None):
+        self.channel_name = channel_name
+        self.flush_interval = (
+            settings.CHAT_FLUSH_INTERVAL_MS / 1000 if flush_interval is None else flush_interval
+        )
+        self.flush_chars = flush_chars or settings.CHAT_FLUSH_MAX_CHARS
+        self.events_sent = 0
+        self._buffer = []
+        self._buffered_chars = 0
+        self._timer = None
+        # Garantit l'ordre des événements lorsque plusieurs envois se chevauchent
+        self._lock = asyncio.Lock()
+
+    async def write(self, text: str):
+        """
+        Ajoute du texte au tampon et le publie si le seuil de taille est atteint.
+
+        :param text: Texte à publier.
+        """
+        if not text:
+            return
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if self._buffered_chars >= self.flush_chars:
+            await self.flush()
+        elif self._timer is None:
+            # Publier au plus tard après l'intervalle, même si la génération marque une pause
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        """
+        Publie le contenu du tampon, s'il n'est pas vide.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer = []
+            self._buffered_chars = 0
+            await publish_event(self.channel_name, "message", {"text": text})
+            self.events_sent += 1
+
+    async def close(self, event_type: str = "done", **data):
+        """
+        Publie le reste du tampon puis un événement final (sources, durées...).
+
+        :param event_type: Type de l'événement final.
+        :param data: Données de l'événement final.
+        """
+        await self.flush()
+        async with self._lock:
+            await publish_event(self.channel_name, event_type, data)
+
+
+class Stopwatch:
+    """
+    Mesure les durées des étapes d'une requête, en millisecondes depuis sa création.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name: str):
+        """
+        Enregistre la durée écoulée jusqu'à maintenant sous le nom donné (une seule fois par nom).
+
+        :param name: Nom de l'étape.
+        """
+        self.marks.setdefault(name, round((time.perf_counter() - self.start) * 1000, 1))
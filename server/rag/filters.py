@@ -0,0 +1,126 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+# Métadonnées des morceaux sur lesquelles les recherches peuvent être filtrées (indexées par les bases)
+FILTERABLE_METADATA = ("file_name", "page", "uploaded_at")
+
+# Opérateurs de comparaison des filtres (syntaxe des filtres "where" de Chroma) et leur équivalent SQL
+COMPARISON_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """
+    Filtres d'une recherche : fichiers sources, intervalle de pages (numérotées à partir de 1,
+    bornes incluses) et intervalle de dates de téléversement (horodatages Unix, "avant" exclu).
+    """
+
+    file_names: tuple = ()
+    page_from: int | None = None
+    page_to: int | None = None
+    uploaded_after: float | None = None
+    uploaded_before: float | None = None
+
+    @classmethod
+    def from_query(cls, query):
+        """
+        Lit les filtres des paramètres d'une requête HTTP : "file_name" (répétable), "page_from",
+        "page_to", "uploaded_after" et "uploaded_before" (dates ISO 8601, par exemple "2024-05-01").
+
+        :param query: Paramètres de la requête (QueryDict de Django : `request.POST` ou `request.GET`).
+        :return: Les filtres (SearchFilters).
+        :raises ValueError: Si un paramètre est invalide.
+        """
+        return cls(
+            file_names=tuple(name for name in query.getlist("file_name") if name),
+            page_from=_parse_page(query.get("page_from")),
+            page_to=_parse_page(query.get("page_to")),
+            uploaded_after=_parse_date(query.get("uploaded_after")),
+            uploaded_before=_parse_date(query.get("uploaded_before")),
+        )
+
+    def to_where(self):
+        """
+        Convertit les filtres en filtre "where" de Chroma, appliqué pendant la recherche vectorielle.
+
+        :return: Le filtre, ou None si aucun filtre n'est demandé.
+        """
+        clauses = []
+        if self.file_names:
+            clauses.append({"file_name": {"$in": list(self.file_names)}})
+        # Les pages sont numérotées à partir de 0 dans les métadonnées
+        if self.page_from is not None:
+            clauses.append({"page": {"$gte": self.page_from - 1}})
+        if self.page_to is not None:
+            clauses.append({"page": {"$lte": self.page_to - 1}})
+        if self.uploaded_after is not None:
+            clauses.append({"uploaded_at": {"$gte": self.uploaded_after}})
+        if self.uploaded_before is not None:
+            clauses.append({"uploaded_at": {"$lt": self.uploaded_before}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def where_to_sql(where: dict, column: str = "metadata"):
+    """
+    Traduit un filtre "where" (syntaxe de Chroma : "$and", "$or", "$in", "$nin" et comparaisons)
+    en condition SQL sur une colonne de métadonnées JSON, pour les bases stockées dans SQLite.
+
+    :param where: Filtre à traduire.
+    :param column: Colonne contenant les métadonnées (JSON).
+    :return: Couple (condition SQL, paramètres).
+    :raises ValueError: Si le filtre utilise un opérateur non supporté.
+    """
+    if len(where) != 1:
+        # Plusieurs champs au premier niveau : équivalent à "$and"
+        return where_to_sql({"$and": [{key: value} for key, value in where.items()]}, column)
+
+    key, condition = next(iter(where.items()))
+    if key in ("$and", "$or"):
+        parts = [where_to_sql(clause, column) for clause in condition]
+        joiner = " AND " if key == "$and" else " OR "
+        return "(" + joiner.join(sql for sql, _ in parts) + ")", [param for _, params in parts for param in params]
+
+    if not re.fullmatch(r"\w+", key):
+        raise ValueError(f"Nom de métadonnée invalide : {key!r}")
+    # L'expression est identique à celle des index des bases, pour qu'ils soient utilisés
+    field = f"json_extract({column}, '$.{key}')"
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    if len(condition) != 1:
+        raise ValueError(f"Un seul opérateur par métadonnée : {condition}")
+    operator, value = next(iter(condition.items()))
+    if operator in ("$in", "$nin"):
+        placeholders = ",".join("?" * len(value))
+        negation = "NOT " if operator == "$nin" else ""
+        return f"{field} {negation}IN ({placeholders})", list(value)
+    if operator not in COMPARISON_OPERATORS:
+        raise ValueError(f"Opérateur de filtre non supporté : {operator}")
+    return f"{field} {COMPARISON_OPERATORS[operator]} ?", [value]
+
+
+def metadata_index_statements(table: str, column: str = "metadata"):
+    """
+    :return: Requêtes de création des index SQLite sur les métadonnées filtrables d'une table.
+    """
+    return [
+        f"CREATE INDEX IF NOT EXISTS {table}_{key} ON {table} (json_extract({column}, '$.{key}'))"
+        for key in FILTERABLE_METADATA
+    ]
+
+
+def _parse_page(value: str | None):
+    if not value:
+        return None
+    page = int(value)
+    if page < 1:
+        raise ValueError(f"Numéro de page invalide : {value}")
+    return page
+
+
+def _parse_date(value: str | None):
+    if not value:
+        return None
+    return datetime.fromisoformat(value).timestamp()
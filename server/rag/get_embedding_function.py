@@ -1,6 +1,11 @@
+from functools import lru_cache
+
+import httpx
 from django.conf import settings
 from langchain_ollama import OllamaEmbeddings
 
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+
 # Récupération du nom du modèle à partir des paramètres Django
 model_name = settings.EMBEDDING_MODEL_NAME
 
@@ -11,13 +16,53 @@ def get_embedding_function():
 
     L'embedding est utilisé pour convertir du texte en représentations numériques
     afin de permettre des comparaisons et des recherches basées sur la similarité.
+    Si un cache d'embeddings est configuré, les textes déjà intégrés sont lus depuis le disque
+    au lieu d'être recalculés par le modèle.
 
-    :return: Une instance d'OllamaEmbeddings.
+    :return: Une instance d'OllamaEmbeddings, enveloppée par le cache s'il est activé.
     """
     # Charger le modèle spécifié dans les paramètres
     model_name = settings.EMBEDDING_MODEL_NAME
 
     # Initialiser la fonction d'embedding avec le modèle donné
-    embeddings = OllamaEmbeddings(model=model_name)
+    embeddings = OllamaEmbeddings(
+        model=model_name,
+        base_url=settings.OLLAMA_BASE_URL,
+        client_kwargs=get_ollama_client_kwargs(),
+    )
+
+    cache = get_embedding_cache()
+    if cache is not None:
+        return CachedEmbeddings(embeddings, cache)
+    return embeddings
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache():
+    """
+    Retourne le cache d'embeddings partagé par le processus.
 
-    return embeddings
\ No newline at end of file
+    :return: Une instance d'EmbeddingCache, ou None si le cache est désactivé.
+    """
+    if not settings.EMBEDDING_CACHE_PATH:
+        return None
+    return EmbeddingCache(
+        settings.EMBEDDING_CACHE_PATH,
+        settings.EMBEDDING_MODEL_NAME,
+        settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    )
+
+
+def get_ollama_client_kwargs():
+    """
+    Paramètres du client HTTP vers le serveur de modèles : les connexions
+    sont conservées et réutilisées entre les requêtes (pool de connexions).
+
+    :return: Dictionnaire de paramètres pour le client httpx d'Ollama.
+    """
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+        ),
+    }
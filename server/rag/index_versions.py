@@ -0,0 +1,280 @@
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+# Fichier pointant vers la version en service de l'index, dans le dossier racine de l'index
+CURRENT_FILENAME = "CURRENT"
+# Fichier pointant vers la version en cours de construction (reprise après une interruption)
+BUILDING_FILENAME = "BUILDING"
+# Fichier verrouillé (en partage) par chaque processus qui utilise une version
+LEASE_FILENAME = "LEASE"
+# Verrou des opérations sur les pointeurs, dans le dossier racine de l'index
+LOCK_FILENAME = ".lock"
+
+# Préfixe des dossiers de version, et nom de la première version créée
+VERSION_PREFIX = "v-"
+INITIAL_VERSION = "v-0"
+# Version d'un index créé avant les versions : ses fichiers sont directement dans le dossier racine
+LEGACY_VERSION = ""
+
+_RESERVED_NAMES = {CURRENT_FILENAME, BUILDING_FILENAME, LEASE_FILENAME, LOCK_FILENAME}
+
+
+def version_path(root: str, version: str):
+    """
+    :param root: Dossier racine de l'index.
+    :param version: Nom de la version.
+    :return: Dossier de la version (le dossier racine pour un index antérieur aux versions).
+    """
+    return os.path.join(root, version) if version else root
+
+
+def read_current(root: str):
+    """
+    Lit la version en service d'un index.
+
+    :param root: Dossier racine de l'index.
+    :return: Nom de la version, `LEGACY_VERSION` pour un index antérieur aux versions,
+             ou None si l'index n'a pas encore été créé.
+    """
+    current = _read_pointer(root, CURRENT_FILENAME)
+    if current is not None:
+        return current
+    return LEGACY_VERSION if _legacy_entries(root) else None
+
+
+def read_building(root: str):
+    """
+    :param root: Dossier racine de l'index.
+    :return: Nom de la version en cours de construction, ou None.
+    """
+    return _read_pointer(root, BUILDING_FILENAME)
+
+
+def create_version(root: str, building: bool = False):
+    """
+    Crée le dossier d'une nouvelle version, qui n'est pas encore en service, et prend un bail
+    dessus pour qu'elle ne soit pas supprimée pendant sa construction.
+
+    :param root: Dossier racine de l'index.
+    :param building: Enregistrer la version comme étant en construction (elle n'est alors pas
+                     supprimée par `collect_garbage` et peut être reprise après une interruption).
+    :return: Couple (nom de la version, bail sur la version).
+    """
+    # Les noms sont triés par date de création
+    version = f"{VERSION_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(root, exist_ok=True)
+    with root_lock(root):
+        os.makedirs(version_path(root, version))
+        lease = VersionLease.acquire(root, version)
+        if building:
+            _write_pointer(root, BUILDING_FILENAME, version)
+    return version, lease
+
+
+def publish_version(root: str, version: str):
+    """
+    Met une version en service en remplaçant le pointeur `CURRENT` par un renommage atomique :
+    les nouvelles requêtes utilisent la nouvelle version, celles en cours terminent sur l'ancienne.
+
+    :param root: Dossier racine de l'index.
+    :param version: Nom de la version.
+    """
+    with root_lock(root):
+        _write_pointer(root, CURRENT_FILENAME, version)
+        if read_building(root) == version:
+            os.remove(os.path.join(root, BUILDING_FILENAME))
+
+
+def ensure_current(root: str):
+    """
+    Retourne la version en service d'un index, en créant et publiant une première version vide
+    si l'index n'existe pas encore.
+
+    :param root: Dossier racine de l'index.
+    :return: Nom de la version en service.
+    """
+    current = read_current(root)
+    if current is not None:
+        return current
+    os.makedirs(root, exist_ok=True)
+    with root_lock(root):
+        # Un autre processus a pu créer l'index en attendant le verrou
+        current = read_current(root)
+        if current is None:
+            current = INITIAL_VERSION
+            os.makedirs(version_path(root, current), exist_ok=True)
+            _write_pointer(root, CURRENT_FILENAME, current)
+    return current
+
+
+@contextmanager
+def root_lock(root: str):
+    """
+    Verrou exclusif entre processus sur les pointeurs d'un index.
+    """
+    with open(os.path.join(root, LOCK_FILENAME), "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+class VersionLease:
+    """
+    Bail d'un processus sur une version de l'index : tant qu'il est détenu (verrou partagé sur le
+    fichier `LEASE` de la version), `collect_garbage` ne supprime pas la version, même si elle
+    n'est plus en service.
+
+    Un bail exclusif réserve la version à un seul processus, qui peut la modifier sans qu'aucun
+    serveur ne l'utilise (indexation hors serveur, voir `Collection.lock_current`).
+    """
+
+    def __init__(self, lease_file):
+        self._lease_file = lease_file
+
+    @classmethod
+    def acquire(cls, root: str, version: str, exclusive: bool = False):
+        """
+        :param root: Dossier racine de l'index.
+        :param version: Nom de la version.
+        :param exclusive: Prendre un bail exclusif, refusé si un autre processus utilise la version.
+        :return: Le bail (VersionLease), ou None si la version est supprimée, en cours de suppression,
+                 réservée par un bail exclusif, ou (bail exclusif) utilisée par un autre processus.
+        """
+        lease_path = os.path.join(version_path(root, version), LEASE_FILENAME)
+        try:
+            lease_file = open(lease_path, "a+")
+        except FileNotFoundError:
+            return None
+        if fcntl is not None:
+            try:
+                fcntl.flock(lease_file, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lease_file.close()
+                return None
+        # La version a pu être supprimée entre l'ouverture et le verrouillage
+        try:
+            still_there = os.stat(lease_path).st_ino == os.fstat(lease_file.fileno()).st_ino
+        except FileNotFoundError:
+            still_there = False
+        if not still_there:
+            lease_file.close()
+            return None
+        return cls(lease_file)
+
+    def release(self):
+        """
+        Libère le bail.
+        """
+        self._lease_file.close()
+
+
+def collect_garbage(root: str):
+    """
+    Supprime les versions d'un index qui ne sont ni en service, ni en construction,
+    ni utilisées par un processus (bail détenu).
+
+    :param root: Dossier racine de l'index.
+    :return: Liste des versions supprimées.
+    """
+    if not os.path.isdir(root):
+        return []
+    with root_lock(root):
+        return _collect_garbage(root)
+
+
+def _collect_garbage(root: str):
+    """
+    Voir `collect_garbage`. Doit être appelée avec le verrou du dossier racine acquis.
+    """
+    current = read_current(root)
+    if current is None:
+        return []
+    keep = {current, read_building(root)}
+    removed = []
+    for name in sorted(os.listdir(root)):
+        if not name.startswith(VERSION_PREFIX) or name in keep:
+            continue
+        with _exclusive_lease(os.path.join(root, name, LEASE_FILENAME)) as acquired:
+            if acquired:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                removed.append(name)
+
+    # Fichiers d'un index antérieur aux versions, remplacé par une version
+    if current != LEGACY_VERSION and _legacy_entries(root):
+        lease_path = os.path.join(root, LEASE_FILENAME)
+        with _exclusive_lease(lease_path) as acquired:
+            if acquired:
+                for name in _legacy_entries(root):
+                    path = os.path.join(root, name)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+                removed.append(LEGACY_VERSION)
+        if LEGACY_VERSION in removed:
+            os.remove(lease_path)
+    return removed
+
+
+@contextmanager
+def _exclusive_lease(lease_path: str):
+    """
+    Tente d'obtenir sans attendre le verrou exclusif du bail d'une version.
+    Produit True si aucun processus ne détient de bail sur la version.
+    """
+    try:
+        lease_file = open(lease_path, "a+")
+    except FileNotFoundError:
+        # Dossier de la version déjà supprimé
+        yield True
+        return
+    with lease_file:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def _legacy_entries(root: str):
+    """
+    :return: Fichiers d'un index antérieur aux versions présents dans le dossier racine.
+    """
+    if not os.path.isdir(root):
+        return []
+    return [
+        name for name in os.listdir(root)
+        if name not in _RESERVED_NAMES
+        and not name.startswith(VERSION_PREFIX)
+        and not name.endswith(".tmp")
+    ]
+
+
+def _read_pointer(root: str, filename: str):
+    try:
+        with open(os.path.join(root, filename), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(root: str, filename: str, version: str):
+    path = os.path.join(root, filename)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,183 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from .collection import Collection, get_collection
+from .populate_database import ingest_files, populate_database, rebuild_database
+
+
+@dataclass
+class IngestionJob:
+    """
+    Tâche d'indexation exécutée en arrière-plan, avec son avancement.
+
+    `files` vaut None pour une synchronisation complète du répertoire de données de la collection,
+    et `rebuild` indique une reconstruction complète de l'index dans une nouvelle version.
+    """
+
+    id: str
+    collection: str
+    files: list[str] | None
+    rebuild: bool = False
+    status: str = "pending"  # pending, running, done, failed
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    files_indexed: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_pages(self, count: int):
+        with self._lock:
+            self.pages_parsed += count
+
+    def add_chunks(self, count: int):
+        with self._lock:
+            self.chunks_total += count
+
+    def add_embedded(self, count: int):
+        with self._lock:
+            self.chunks_embedded += count
+
+    def eta(self):
+        """
+        Estime le temps restant (en secondes) à partir du débit d'intégration observé.
+
+        :return: Temps restant estimé, ou None si aucune estimation n'est encore possible.
+        """
+        if self.status != "running" or not self.chunks_embedded or self.started_at is None:
+            return None
+        elapsed = time.time() - self.started_at
+        remaining = self.chunks_total - self.chunks_embedded
+        return round(elapsed / self.chunks_embedded * remaining, 1)
+
+    def to_dict(self):
+        """
+        :return: Représentation JSON de la tâche et de son avancement.
+        """
+        return {
+            "id": self.id,
+            "collection": self.collection,
+            "status": self.status,
+            "files": self.files,
+            "rebuild": self.rebuild,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "files_indexed": self.files_indexed,
+            "eta_seconds": self.eta(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """
+    File d'attente des tâches d'indexation, exécutées par un pool de workers local.
+
+    Une demande portant sur des fichiers déjà en attente d'indexation réutilise la tâche
+    existante. L'indexation d'un même fichier par deux tâches est sérialisée par les
+    verrous par fichier de `index_file`.
+    """
+
+    def __init__(self, max_workers: int, max_finished_jobs: int = 100):
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def enqueue(
+        self,
+        files: list[str] | None = None,
+        collection: Collection | None = None,
+        rebuild: bool = False,
+        reuse_running: bool = False,
+    ):
+        """
+        Ajoute une tâche d'indexation, ou retourne la tâche en attente qui couvre déjà ces fichiers.
+
+        :param files: Fichiers à indexer, ou None pour synchroniser tout le répertoire de données.
+        :param collection: Collection des fichiers (collection par défaut si absente).
+        :param rebuild: Reconstruire tout l'index dans une nouvelle version (`files` est alors ignoré).
+        :param reuse_running: Retourner aussi une tâche en cours qui couvre ces fichiers. À réserver aux
+                              demandes de rattrapage : une tâche en cours peut avoir déjà listé les
+                              fichiers du répertoire de données avant l'arrivée des derniers.
+        :return: La tâche d'indexation (IngestionJob).
+        """
+        collection = collection or get_collection()
+        requested = None if files is None or rebuild else sorted(set(files))
+        reusable = ("pending", "running") if reuse_running else ("pending",)
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status not in reusable or job.collection != collection.name or job.rebuild != rebuild:
+                    continue
+                # Une synchronisation complète en attente couvre toutes les demandes
+                if job.files is None or (requested is not None and set(requested) <= set(job.files)):
+                    return job
+
+            job = IngestionJob(id=uuid.uuid4().hex, collection=collection.name, files=requested, rebuild=rebuild)
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str):
+        """
+        :param job_id: Identifiant de la tâche.
+        :return: La tâche, ou None si elle est inconnue.
+        """
+        return self._jobs.get(job_id)
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            collection = get_collection(job.collection)
+            if job.rebuild:
+                job.files_indexed = rebuild_database(progress=job, collection=collection)
+            elif job.files is None:
+                job.files_indexed = populate_database(progress=job, collection=collection)
+            else:
+                job.files_indexed = ingest_files(job.files, progress=job, collection=collection)
+            job.status = "done"
+        except Exception as e:
+            print(f"🚫 Échec de la tâche d'indexation {job.id} : {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_finished_jobs(self):
+        """
+        Ne conserve que les tâches terminées les plus récentes. Doit être appelée avec le verrou acquis.
+        """
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue():
+    """
+    Retourne la file d'attente des tâches d'indexation du processus.
+
+    :return: L'instance d'IngestionQueue (créée au premier appel).
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = IngestionQueue(settings.INGESTION_WORKERS)
+        return _queue
@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from langchain.schema.document import Document
+
+from .filters import metadata_index_statements, where_to_sql
+
+# Nom du fichier de l'index lexical, stocké à côté de la base Chroma
+LEXICAL_INDEX_FILENAME = "lexical.sqlite3"
+
+
+class LexicalIndex:
+    """
+    Index inversé des morceaux (SQLite FTS5), interrogé avec le classement BM25.
+
+    Il complète la recherche par similarité pour les termes rares ou exacts (identifiants,
+    références...) que les embeddings captent mal. Il est tenu à jour en même temps que la
+    base Chroma : les morceaux y sont ajoutés à l'intégration et retirés à la suppression.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT NOT NULL)"
+        )
+        for statement in metadata_index_statements("chunks"):
+            self._connection.execute(statement)
+        # Les accents sont ignorés pour que "reference" retrouve "référence"
+        self._connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts "
+            "USING fts5(content, tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._connection.commit()
+
+    def count(self):
+        """
+        :return: Nombre de morceaux indexés.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, chunk_ids: list[str], texts: list[str], metadatas: list[dict]):
+        """
+        Ajoute (ou remplace) des morceaux dans l'index.
+
+        :param chunk_ids: Identifiants des morceaux.
+        :param texts: Contenus des morceaux.
+        :param metadatas: Métadonnées des morceaux.
+        """
+        with self._lock, self._connection:
+            self._delete(chunk_ids)
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                row = self._connection.execute(
+                    "INSERT INTO chunks (id, metadata) VALUES (?, ?)",
+                    (chunk_id, json.dumps(metadata)),
+                ).lastrowid
+                self._connection.execute(
+                    "INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)", (row, text)
+                )
+
+    def delete(self, chunk_ids: list[str]):
+        """
+        Retire des morceaux de l'index.
+
+        :param chunk_ids: Identifiants des morceaux.
+        """
+        with self._lock, self._connection:
+            self._delete(chunk_ids)
+
+    def search(self, query_text: str, k: int, where: dict | None = None):
+        """
+        Recherche les morceaux les plus pertinents pour une requête (classement BM25).
+
+        :param query_text: Texte de la requête.
+        :param k: Nombre maximal de résultats.
+        :param where: Filtre optionnel sur les métadonnées (syntaxe "where" de Chroma).
+        :return: Liste de couples (document, score), du plus au moins pertinent
+                 (score BM25 : plus il est élevé, plus le morceau est pertinent).
+        """
+        match = build_match_query(query_text)
+        if not match:
+            return []
+        condition, params = where_to_sql(where, "chunks.metadata") if where else ("1", [])
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT chunks_fts.content, chunks.metadata, bm25(chunks_fts) AS rank "
+                "FROM chunks_fts JOIN chunks ON chunks.row = chunks_fts.rowid "
+                f"WHERE chunks_fts MATCH ? AND {condition} ORDER BY rank LIMIT ?",
+                (match, *params, k),
+            ).fetchall()
+        # SQLite retourne l'opposé du score BM25 (les meilleurs résultats ont le rang le plus bas)
+        return [
+            (Document(page_content=content, metadata=json.loads(metadata)), -rank)
+            for content, metadata, rank in rows
+        ]
+
+    def close(self):
+        """
+        Ferme la connexion à l'index.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def _delete(self, chunk_ids: list[str]):
+        """
+        Retire des morceaux de l'index. Doit être appelée avec le verrou acquis, dans une transaction.
+        """
+        # SQLite limite le nombre de paramètres par requête : on procède par tranches
+        for i in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = [
+                (row,) for (row,) in self._connection.execute(
+                    f"SELECT row FROM chunks WHERE id IN ({placeholders})", batch
+                )
+            ]
+            self._connection.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rows)
+            self._connection.executemany("DELETE FROM chunks WHERE row = ?", rows)
+
+
+def build_match_query(query_text: str):
+    """
+    Convertit une question en requête FTS5 : chaque mot (ou identifiant comme "AB-123")
+    est cherché comme une expression, et un morceau correspond s'il contient l'un d'eux.
+
+    :param query_text: Texte de la requête.
+    :return: Requête FTS5, ou une chaîne vide si la question ne contient aucun mot.
+    """
+    terms = [term.strip("\"'«»()[]{}.,;:!?") for term in query_text.split()]
+    return " OR ".join(
+        '"{}"'.format(term.replace('"', '""')) for term in terms if re.search(r"\w", term)
+    )
+
+
+def rebuild_lexical_index(index: LexicalIndex, db, batch_size: int = 1000):
+    """
+    Reconstruit l'index lexical à partir du contenu de la base Chroma
+    (par exemple pour une base créée avant l'ajout de l'index).
+
+    :param index: Index lexical à remplir.
+    :param db: Base Chroma.
+    :param batch_size: Nombre de morceaux lus par requête.
+    """
+    total = db.count()
+    print(f"🔎 Construction de l'index lexical ({total} morceaux)")
+    with index._lock, index._connection:
+        index._connection.execute("DELETE FROM chunks")
+        index._connection.execute("DELETE FROM chunks_fts")
+    for offset in range(0, total, batch_size):
+        batch = db.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        index.add(batch["ids"], batch["documents"], batch["metadatas"])
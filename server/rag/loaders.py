@@ -0,0 +1,114 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from .metrics import STAGE_DURATION, span
+
+# Pool de processus partagé pour l'analyse des PDF, créé à la première utilisation
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def load_pdf_pages(file_path: str):
+    """
+    Charge les pages d'un fichier PDF. Exécutée dans un processus du pool :
+    ce module ne doit donc pas dépendre de la configuration Django.
+
+    :param file_path: Chemin du fichier PDF.
+    :return: Liste de documents (une page par document).
+    """
+    return PyPDFLoader(file_path).load()
+
+
+def _timed_load_pdf_pages(file_path: str):
+    """
+    Charge les pages d'un fichier PDF dans un processus du pool, en mesurant la durée de l'analyse
+    (les métriques du processus du pool ne sont pas visibles depuis le serveur).
+
+    :return: Couple (pages, durée en secondes).
+    """
+    start = time.perf_counter()
+    pages = load_pdf_pages(file_path)
+    return pages, time.perf_counter() - start
+
+
+def iter_parsed_files(file_paths: list[str], max_workers: int):
+    """
+    Analyse des fichiers PDF en parallèle et retourne leurs pages au fur et à mesure.
+
+    Au plus `max_workers` fichiers sont en cours d'analyse à la fois, et un nouveau fichier
+    n'est lancé que lorsque le résultat précédent a été consommé : la mémoire utilisée dépend
+    du nombre de workers, pas de la taille du corpus.
+
+    :param file_paths: Chemins des fichiers à analyser.
+    :param max_workers: Nombre de processus d'analyse.
+    :return: Générateur de triplets (chemin, pages, erreur) ; en cas d'échec, les pages
+             sont une liste vide et l'erreur est l'exception levée.
+    """
+    # Pour un seul fichier, lancer un processus coûterait plus cher que l'analyse elle-même
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            try:
+                with span("parse"):
+                    pages = load_pdf_pages(file_path)
+            except Exception as e:
+                yield file_path, [], e
+            else:
+                yield file_path, pages, None
+        return
+
+    pool = get_parser_pool(max_workers)
+    remaining = iter(file_paths)
+    pending = {}
+    try:
+        for file_path in remaining:
+            pending[pool.submit(_timed_load_pdf_pages, file_path)] = file_path
+            if len(pending) >= max_workers:
+                break
+
+        while pending:
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                file_path = pending.pop(future)
+                try:
+                    pages, seconds = future.result()
+                    STAGE_DURATION.observe(seconds, stage="parse")
+                    result = pages, None
+                except Exception as e:
+                    result = [], e
+                yield file_path, *result
+
+                # Lancer le fichier suivant une fois le résultat consommé
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending[pool.submit(_timed_load_pdf_pages, next_path)] = next_path
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def get_parser_pool(max_workers: int):
+    """
+    Retourne le pool de processus d'analyse des PDF, recréé si le nombre de workers change.
+
+    Les processus sont démarrés avec la méthode "spawn" : le processus serveur utilise des
+    threads (Chroma, clients HTTP) qu'il n'est pas sûr de dupliquer par "fork".
+
+    :param max_workers: Nombre de processus.
+    :return: Le ProcessPoolExecutor partagé.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_workers = max_workers
+        return _pool
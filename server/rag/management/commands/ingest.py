@@ -0,0 +1,211 @@
+import glob
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.checkpoint import IngestionCheckpoint
+from rag.collection import Collection, get_collection
+from rag.embedding_pipeline import EmbeddingPipeline
+from rag.manifest import get_manifest
+from rag.populate_database import index_files, list_data_files, needs_indexing, remove_deleted_files
+from rag.stats import recount_collection_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Indexe en masse des fichiers PDF (dossiers parcourus récursivement, fichiers ou motifs glob) "
+        "dans une collection. L'avancement est enregistré dans un point de reprise : une indexation "
+        "interrompue reprend là où elle s'était arrêtée lorsqu'elle est relancée avec les mêmes sources. "
+        "Sans --rebuild, l'index en service est modifié sur place : la commande refuse de s'exécuter "
+        "si un serveur utilise la collection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sources",
+            nargs="*",
+            help="Dossiers, fichiers ou motifs glob (répertoire de données de la collection si absent).",
+        )
+        parser.add_argument("--collection", default=None, help="Collection à indexer (collection par défaut si absente).")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.PDF_PARSER_WORKERS,
+            help="Nombre de processus d'analyse des PDF (défaut : PDF_PARSER_WORKERS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EMBEDDING_BATCH_SIZE,
+            help="Nombre de morceaux par lot d'intégration (défaut : EMBEDDING_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--checkpoint-every",
+            type=int,
+            default=32,
+            help="Nombre de fichiers indexés entre deux enregistrements du point de reprise.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Affiche les fichiers qui seraient indexés, sans rien modifier.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Reconstruit l'index à partir du répertoire de données de la collection dans une nouvelle "
+                 "version, puis la met en service d'un coup : les requêtes continuent d'utiliser la version "
+                 "actuelle pendant la construction. Incompatible avec des sources explicites.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore le point de reprise existant et recommence depuis le début.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            collection = get_collection(options["collection"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["workers"] < 1 or options["batch_size"] < 1 or options["checkpoint_every"] < 1:
+            raise CommandError("--workers, --batch-size et --checkpoint-every doivent être positifs")
+        sources = options["sources"]
+        if options["rebuild"] and sources:
+            # La nouvelle version remplace tout l'index : construite à partir de quelques sources,
+            # elle perdrait les autres fichiers de la collection
+            raise CommandError(
+                "--rebuild reconstruit toute la collection depuis son répertoire de données : "
+                "il ne peut pas être combiné avec des sources"
+            )
+        file_paths = find_source_files(sources) if sources else list_data_files(collection)
+
+        if options["dry_run"]:
+            self.dry_run(collection, file_paths, rebuild=options["rebuild"])
+            return
+
+        if options["rebuild"]:
+            # Reconstruction : on indexe dans une nouvelle version de l'index, reprise si elle a été interrompue
+            target = collection.new_version(resume=not options["restart"])
+            self.stdout.write(f"🏗️ Construction de la version {target.version} de la collection '{collection.name}'")
+        else:
+            # Indexation sur place : la version en service est réservée à cette commande, aucun serveur
+            # ne doit l'avoir ouverte (Chroma ne supporte pas plusieurs processus écrivant dans la même base)
+            target = collection.lock_current()
+            if target is None:
+                raise CommandError(
+                    f"La collection '{collection.name}' est utilisée par un serveur en cours : "
+                    "arrêtez-le ou utilisez --rebuild"
+                )
+
+        checkpoint = IngestionCheckpoint.load(target, sources)
+        if options["restart"]:
+            checkpoint.remove()
+
+        pending_files = [file_path for file_path in file_paths if file_path not in checkpoint.done]
+        if checkpoint.done:
+            self.stdout.write(
+                f"⏩ Reprise : {len(file_paths) - len(pending_files)}/{len(file_paths)} fichiers déjà traités"
+            )
+
+        start = time.perf_counter()
+        indexed_files = self.ingest(target, pending_files, checkpoint, options, remove_deleted=not sources)
+        checkpoint.remove()
+
+        if options["rebuild"]:
+            collection.publish(target)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {indexed_files} fichiers (ré)indexés sur {len(pending_files)} examinés en {elapsed:.1f} s"
+        ))
+
+    def ingest(self, collection: Collection, file_paths: list[str], checkpoint: IngestionCheckpoint, options, remove_deleted: bool):
+        """
+        Indexe les fichiers par groupes de `--checkpoint-every`, en enregistrant le point de reprise
+        après chaque groupe.
+
+        :param collection: Collection dans laquelle indexer.
+        :param file_paths: Fichiers restant à traiter.
+        :param checkpoint: Point de reprise de l'indexation.
+        :param options: Options de la commande.
+        :param remove_deleted: Retirer de la base les fichiers du manifeste qui n'existent plus.
+        :return: Nombre de fichiers (ré)indexés.
+        """
+        group_size = options["checkpoint_every"]
+        total = len(checkpoint.done) + len(file_paths)
+        indexed_files = 0
+        with collection.use():
+            manifest = get_manifest(collection)
+            pipeline = EmbeddingPipeline(collection, batch_size=options["batch_size"])
+            if remove_deleted:
+                remove_deleted_files(manifest, collection)
+            try:
+                for i in range(0, len(file_paths), group_size):
+                    group = file_paths[i:i + group_size]
+                    indexed_files += index_files(group, manifest, collection, pipeline, workers=options["workers"])
+                    checkpoint.done.update(group)
+                    checkpoint.save()
+                    self.stdout.write(f"📦 {len(checkpoint.done)}/{total} fichiers traités")
+            finally:
+                with manifest.lock:
+                    manifest.save()
+                pipeline.report()
+
+            recount_collection_stats(collection)
+        collection.close()
+        return indexed_files
+
+    def dry_run(self, collection: Collection, file_paths: list[str], rebuild: bool):
+        """
+        Affiche les fichiers nouveaux ou modifiés qui seraient indexés (tous en cas de reconstruction).
+
+        :param collection: Collection dans laquelle les fichiers seraient indexés.
+        :param file_paths: Fichiers désignés par les sources.
+        :param rebuild: Reconstruction complète de l'index.
+        """
+        manifest = None if rebuild else get_manifest(collection)
+        to_index = [
+            file_path for file_path in file_paths
+            if manifest is None or needs_indexing(file_path, manifest)
+        ]
+        total_size = sum(os.path.getsize(file_path) for file_path in to_index)
+        for file_path in to_index:
+            self.stdout.write(f"  {file_path}")
+        self.stdout.write(
+            f"🔍 {len(to_index)} fichiers à indexer ({total_size / 1024 / 1024:.1f} Mo) "
+            f"sur {len(file_paths)} examinés, rien n'a été modifié"
+        )
+
+
+def find_source_files(sources: list[str]):
+    """
+    Liste les fichiers PDF désignés par des sources : les dossiers sont parcourus récursivement
+    et les motifs glob développés (`**` compris). Les fichiers et dossiers cachés sont ignorés.
+
+    :param sources: Dossiers, fichiers ou motifs glob.
+    :return: Liste triée et sans doublons des chemins absolus des fichiers PDF.
+    :raises CommandError: Si une source ne désigne aucun fichier.
+    """
+    file_paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            matches = []
+            for root, dirs, files in os.walk(source):
+                dirs[:] = [name for name in dirs if not name.startswith(".")]
+                matches.extend(os.path.join(root, name) for name in files)
+        elif os.path.isfile(source):
+            matches = [source]
+        else:
+            matches = glob.glob(source, recursive=True)
+            if not matches:
+                raise CommandError(f"Aucun fichier ne correspond à '{source}'")
+        file_paths.update(
+            os.path.abspath(path) for path in matches
+            if path.lower().endswith(".pdf")
+            and not os.path.basename(path).startswith(".")
+            and os.path.isfile(path)
+        )
+    return sorted(file_paths)
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import threading
+
+from .collection import Collection, get_collection
+
+# Nom du fichier de manifeste, stocké à côté de la base Chroma
+MANIFEST_FILENAME = "manifest.json"
+
+# Manifestes partagés par le processus, par chemin
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest_path(collection: Collection | None = None):
+    """
+    Retourne le chemin du manifeste des fichiers indexés d'une collection.
+
+    Le manifeste est stocké dans le dossier de la version utilisée de l'index : chaque
+    version a donc son propre manifeste, remplacé en même temps qu'elle.
+
+    :param collection: Collection (collection par défaut si absente).
+    :return: Chemin absolu du fichier de manifeste.
+    """
+    collection = collection or get_collection()
+    return os.path.join(collection.index_path, MANIFEST_FILENAME)
+
+
+def get_manifest(collection: Collection | None = None):
+    """
+    Retourne le manifeste d'une collection partagé par le processus, rechargé depuis le disque
+    s'il a été modifié par un autre processus (ou supprimé avec la base).
+
+    Les modifications du manifeste doivent être faites en détenant `manifest.lock`.
+
+    :param collection: Collection (collection par défaut si absente).
+    :return: L'instance de FileManifest.
+    """
+    path = get_manifest_path(collection)
+    with _manifests_lock:
+        manifest = _manifests.get(path)
+        if manifest is None:
+            manifest = _manifests[path] = FileManifest(path, lock=threading.RLock())
+            return manifest
+    with manifest.lock:
+        manifest.reload_if_changed()
+    return manifest
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024):
+    """
+    Calcule l'empreinte SHA-256 du contenu d'un fichier, lu par blocs.
+
+    :param file_path: Chemin du fichier.
+    :param block_size: Taille des blocs lus (en octets).
+    :return: Empreinte hexadécimale du contenu.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """
+    Manifeste persistant des fichiers indexés dans la base Chroma.
+
+    Pour chaque fichier (identifié par son chemin), on conserve sa taille, sa date
+    de modification, l'empreinte de son contenu et les identifiants des morceaux
+    ajoutés à la base. Cela permet de ne recharger que les fichiers nouveaux ou modifiés,
+    et sert d'index fichier -> morceaux pour lister et supprimer les documents sans
+    parcourir toute la base.
+    """
+
+    def __init__(self, path: str, lock=None):
+        self.path = path
+        self.lock = lock or threading.RLock()
+        self.entries = {}
+        self._names = {}
+        self._hashes = {}
+        self._mtime = None
+        self.load()
+
+    def load(self):
+        """
+        Charge le manifeste depuis le disque (manifeste vide s'il n'existe pas).
+        """
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+            self._mtime = os.stat(self.path).st_mtime_ns
+        else:
+            self.entries = {}
+            self._mtime = None
+
+        # Index nom de fichier -> chemins, pour retrouver un document à partir de son nom
+        self._names = {}
+        for file_path in self.entries:
+            self._names.setdefault(os.path.basename(file_path), set()).add(file_path)
+
+        # Index empreinte du contenu -> chemins, pour reconnaître un fichier déjà indexé sous un autre nom
+        self._hashes = {}
+        for file_path, entry in self.entries.items():
+            self._hashes.setdefault(entry["hash"], set()).add(file_path)
+
+    def reload_if_changed(self):
+        """
+        Recharge le manifeste si le fichier sur le disque a changé depuis le dernier chargement
+        ou le dernier enregistrement.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def save(self):
+        """
+        Enregistre le manifeste sur le disque de manière atomique
+        (écriture dans un fichier temporaire puis renommage).
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def get(self, file_path: str):
+        """
+        :param file_path: Chemin du fichier.
+        :return: L'entrée du manifeste pour ce fichier, ou None.
+        """
+        return self.entries.get(file_path)
+
+    def paths(self):
+        """
+        :return: Liste des chemins de fichiers présents dans le manifeste.
+        """
+        return list(self.entries)
+
+    def find(self, file_name: str):
+        """
+        Retrouve les fichiers indexés portant exactement ce nom (sans tenir compte du dossier).
+
+        :param file_name: Nom du fichier (par exemple "mon_fichier.pdf").
+        :return: Liste des chemins correspondants.
+        """
+        return sorted(self._names.get(file_name, ()))
+
+    def find_by_hash(self, content_hash: str):
+        """
+        Retrouve les fichiers indexés dont le contenu a cette empreinte.
+
+        :param content_hash: Empreinte SHA-256 du contenu (voir `hash_file`).
+        :return: Liste des chemins correspondants.
+        """
+        return sorted(self._hashes.get(content_hash, ()))
+
+    def documents(self):
+        """
+        Liste les fichiers indexés avec leur nombre de morceaux.
+
+        :return: Liste de dictionnaires avec les clés "name" et "chunks", triée par nom.
+        """
+        return sorted(
+            (
+                {"name": os.path.basename(file_path), "chunks": len(entry["chunk_ids"])}
+                for file_path, entry in self.entries.items()
+            ),
+            key=lambda document: document["name"],
+        )
+
+    def is_unchanged(self, file_path: str, stat: os.stat_result):
+        """
+        Vérifie rapidement (sans lire le contenu) si un fichier est inchangé
+        depuis sa dernière indexation, à partir de sa taille et de sa date de modification.
+
+        :param file_path: Chemin du fichier.
+        :param stat: Résultat de `os.stat` pour ce fichier.
+        :return: True si la taille et la date de modification sont identiques.
+        """
+        entry = self.entries.get(file_path)
+        return (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        )
+
+    def set(
+        self,
+        file_path: str,
+        stat: os.stat_result,
+        content_hash: str,
+        chunk_ids: list[str],
+        metadata_version: int | None = None,
+    ):
+        """
+        Enregistre (ou remplace) l'entrée d'un fichier.
+
+        :param file_path: Chemin du fichier.
+        :param stat: Résultat de `os.stat` pour ce fichier.
+        :param content_hash: Empreinte du contenu du fichier.
+        :param chunk_ids: Identifiants des morceaux du fichier présents dans la base.
+        :param metadata_version: Version des métadonnées des morceaux (voir `CHUNK_METADATA_VERSION`).
+        """
+        self.remove(file_path)
+        self.entries[file_path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": content_hash,
+            "chunk_ids": list(chunk_ids),
+            "metadata_version": metadata_version,
+        }
+        self._names.setdefault(os.path.basename(file_path), set()).add(file_path)
+        self._hashes.setdefault(content_hash, set()).add(file_path)
+
+    def remove(self, file_path: str):
+        """
+        Retire un fichier du manifeste.
+
+        :param file_path: Chemin du fichier.
+        :return: L'entrée supprimée, ou None si le fichier n'était pas présent.
+        """
+        self._names.get(os.path.basename(file_path), set()).discard(file_path)
+        entry = self.entries.pop(file_path, None)
+        if entry is not None:
+            self._hashes.get(entry["hash"], set()).discard(file_path)
+        return entry
@@ -0,0 +1,210 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes (en secondes) des histogrammes de durée
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Type de contenu du format texte de Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """
+    Compteur Prometheus (valeur croissante), éventuellement décliné par étiquettes.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # Un compteur sans étiquette est exposé dès le démarrage, à zéro
+        self._values = {} if labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """
+        :return: Liste de triplets (nom, étiquettes, valeur).
+        """
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """
+    Histogramme Prometheus (répartition des valeurs observées par tranches), éventuellement
+    décliné par étiquettes.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}  # étiquettes -> [compteurs par tranche, somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        """
+        :return: Liste de triplets (nom, étiquettes, valeur), avec les tranches cumulées.
+        """
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": repr(bound)}, cumulative))
+                samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Ensemble des métriques du processus, rendues au format texte de Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, gauges: list | None = None):
+        """
+        Rend les métriques au format texte de Prometheus.
+
+        :param gauges: Valeurs instantanées à ajouter, sous forme de quadruplets
+                       (nom, type, description, valeur).
+        :return: Le texte à servir sur /metrics.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, metric_type, documentation, value in gauges or []:
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Durée des étapes de l'indexation et des requêtes.", ("stage",)
+)
+QUERIES = REGISTRY.counter("rag_queries_total", "Questions traitées, selon l'utilisation du cache de réponses.", ("cache",))
+PAGES_PARSED = REGISTRY.counter("rag_pages_parsed_total", "Pages de documents analysées.")
+CHUNKS_ADDED = REGISTRY.counter("rag_chunks_added_total", "Morceaux intégrés et ajoutés à la base.")
+CHUNKS_DELETED = REGISTRY.counter("rag_chunks_deleted_total", "Morceaux supprimés de la base.")
+FILES_INDEXED = REGISTRY.counter("rag_files_indexed_total", "Fichiers (ré)indexés.")
+PROMPT_TOKENS = REGISTRY.counter("rag_prompt_tokens_total", "Tokens des prompts envoyés au modèle de langage.")
+GENERATED_TOKENS = REGISTRY.counter("rag_generated_tokens_total", "Tokens générés par le modèle de langage.")
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Mesure la durée d'une étape et l'ajoute à l'histogramme `rag_stage_duration_seconds`.
+
+    :param stage: Nom de l'étape (par exemple "embed_query" ou "split").
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def instrument_stream(response_generator):
+    """
+    Transmet les tokens d'une réponse en mesurant le temps jusqu'au premier token
+    ("first_token") et la durée de la génération complète ("generation").
+
+    :param response_generator: Générateur de la réponse.
+    """
+    start = time.perf_counter()
+    first_token = True
+    try:
+        for chunk in response_generator:
+            if first_token:
+                STAGE_DURATION.observe(time.perf_counter() - start, stage="first_token")
+                first_token = False
+            GENERATED_TOKENS.inc()
+            yield chunk
+    finally:
+        response_generator.close()
+    STAGE_DURATION.observe(time.perf_counter() - start, stage="generation")
+
+
+async def ainstrument_stream(response_generator):
+    """
+    Version asynchrone de `instrument_stream`.
+
+    :param response_generator: Générateur asynchrone de la réponse.
+    """
+    start = time.perf_counter()
+    first_token = True
+    try:
+        async for chunk in response_generator:
+            if first_token:
+                STAGE_DURATION.observe(time.perf_counter() - start, stage="first_token")
+                first_token = False
+            GENERATED_TOKENS.inc()
+            yield chunk
+    finally:
+        await response_generator.aclose()
+    STAGE_DURATION.observe(time.perf_counter() - start, stage="generation")
+
+
+def _format_labels(labels: dict):
+    """
+    :return: Les étiquettes au format Prometheus (par exemple '{stage="split"}'), ou une chaîne vide.
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
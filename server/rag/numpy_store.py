@@ -0,0 +1,470 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain.schema.document import Document
+from langchain_core.embeddings import Embeddings
+
+from .filters import metadata_index_statements, where_to_sql
+
+# Fichiers de la base, stockés dans son dossier
+VECTORS_FILENAME = "vectors.npy"
+METADATA_FILENAME = "vectors.sqlite3"
+
+# Nombre de lignes de la matrice lues à la fois lors d'une recherche exhaustive
+SEARCH_BLOCK_ROWS = 65536
+
+# Capacité initiale de la matrice (en nombre de vecteurs), doublée lorsqu'elle est pleine
+INITIAL_CAPACITY = 1024
+
+# Nombre minimal de lignes supprimées avant de compacter la matrice
+COMPACT_MIN_DELETED = 1024
+
+# Échelle des vecteurs quantifiés en int8 (les composantes d'un vecteur normalisé sont dans [-1, 1])
+INT8_SCALE = 127
+
+# Proportion de vecteurs ajoutés depuis la construction de l'index IVF au-delà de laquelle il est reconstruit
+IVF_REBUILD_RATIO = 0.2
+
+
+class NumpyVectorStore:
+    """
+    Base vectorielle locale : les embeddings normalisés sont stockés dans une matrice NumPy
+    projetée en mémoire (fichier .npy), et les textes et métadonnées dans une base SQLite annexe.
+
+    La recherche calcule la similarité cosinus avec tous les vecteurs par blocs (produit matriciel).
+    Au-delà de `ivf_min_rows` vecteurs, un index IVF (partition des vecteurs par k-moyennes)
+    limite la recherche aux partitions les plus proches de la requête.
+
+    Les vecteurs peuvent être stockés en float32, float16 ou int8 pour réduire la mémoire.
+    Elle expose les mêmes méthodes que la base Chroma utilisées par l'application
+    (`upsert`, `count`, `get`, `delete`, `similarity_search_by_vector_with_relevance_scores`).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Embeddings,
+        dtype: str = "float32",
+        ivf_min_rows: int = 50_000,
+        ivf_probes: int = 8,
+    ):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Type de stockage des vecteurs non supporté : {dtype}")
+        self.path = path
+        self.embeddings = embedding_function
+        self.dtype = np.dtype(dtype)
+        self.ivf_min_rows = ivf_min_rows
+        self.ivf_probes = ivf_probes
+        self._lock = threading.RLock()
+        self._matrix_path = os.path.join(path, VECTORS_FILENAME)
+
+        os.makedirs(path, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(path, METADATA_FILENAME), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT NOT NULL)"
+        )
+        # Index des métadonnées filtrables, pour sélectionner les lignes d'une recherche filtrée sans tout parcourir
+        for statement in metadata_index_statements("rows"):
+            self._connection.execute(statement)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        self._connection.commit()
+        self._load()
+
+    def count(self):
+        """
+        :return: Nombre de vecteurs dans la base.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return int(self._active[:self._size].sum())
+
+    def upsert(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        """
+        Ajoute des vecteurs, ou remplace ceux qui ont déjà ces identifiants.
+
+        :param ids: Identifiants des morceaux.
+        :param embeddings: Embeddings des morceaux.
+        :param documents: Textes des morceaux.
+        :param metadatas: Métadonnées des morceaux.
+        """
+        if not ids:
+            return
+        vectors = self._encode(embeddings)
+        with self._lock:
+            self._reload_if_changed()
+            existing = self._rows_for_ids(ids)
+            rows = []
+            next_row = self._size
+            for chunk_id in ids:
+                if chunk_id in existing:
+                    rows.append(existing[chunk_id])
+                else:
+                    rows.append(next_row)
+                    next_row += 1
+            self._ensure_capacity(next_row, vectors.shape[1])
+
+            # Écrire les vecteurs sur le disque avant de les référencer dans la base annexe
+            self._matrix[rows] = vectors
+            self._matrix.flush()
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (row, chunk_id, document, json.dumps(metadata))
+                        for row, chunk_id, document, metadata in zip(rows, ids, documents, metadatas)
+                    ],
+                )
+                self._bump_version()
+            self._size = next_row
+            self._active[rows] = True
+            # Les vecteurs remplacés ont pu changer de partition dans l'index IVF
+            self._dirty_rows.update(existing.values())
+
+    def get(self, ids: list[str] | None = None, include: list[str] | None = None, limit: int | None = None, offset: int | None = None):
+        """
+        Récupère des morceaux par identifiant, ou tous les morceaux (avec pagination).
+
+        :param ids: Identifiants recherchés (tous les morceaux si absent).
+        :param include: Champs à retourner parmi "documents" et "metadatas" (les deux par défaut).
+        :param limit: Nombre maximal de morceaux retournés.
+        :param offset: Nombre de morceaux à sauter.
+        :return: Dictionnaire avec les clés "ids", "documents" et "metadatas" (None si non demandés).
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            if ids is None:
+                rows = self._connection.execute(
+                    "SELECT id, document, metadata FROM rows ORDER BY row LIMIT ? OFFSET ?",
+                    (-1 if limit is None else limit, offset or 0),
+                ).fetchall()
+            else:
+                rows = []
+                # SQLite limite le nombre de paramètres par requête : on procède par tranches
+                for i in range(0, len(ids), 500):
+                    batch = ids[i:i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows.extend(self._connection.execute(
+                        f"SELECT id, document, metadata FROM rows WHERE id IN ({placeholders})", batch
+                    ))
+        return {
+            "ids": [chunk_id for chunk_id, _, _ in rows],
+            "documents": [document for _, document, _ in rows] if "documents" in include else None,
+            "metadatas": [json.loads(metadata) for _, _, metadata in rows] if "metadatas" in include else None,
+        }
+
+    def delete(self, ids: list[str]):
+        """
+        Supprime des morceaux. La matrice est compactée lorsque la place perdue devient importante.
+
+        :param ids: Identifiants des morceaux à supprimer.
+        """
+        if not ids:
+            return
+        with self._lock:
+            self._reload_if_changed()
+            rows = list(self._rows_for_ids(ids).values())
+            if not rows:
+                return
+            with self._connection:
+                self._connection.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+                self._bump_version()
+            self._active[rows] = False
+
+            deleted = self._size - int(self._active[:self._size].sum())
+            if deleted >= COMPACT_MIN_DELETED and deleted > self._size // 2:
+                self._compact()
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: list[float], k: int = 4, filter: dict | None = None):
+        """
+        Recherche les morceaux les plus proches d'un embedding.
+
+        :param embedding: Embedding de la requête.
+        :param k: Nombre de morceaux à retourner.
+        :param filter: Filtre sur les métadonnées (syntaxe "where" de Chroma) : seules les lignes
+                       qui y correspondent, sélectionnées grâce aux index de la base annexe, sont comparées.
+        :return: Liste de couples (document, similarité cosinus), du plus au moins proche.
+        """
+        query = _normalize(np.asarray([embedding], dtype=np.float32))[0]
+        with self._lock:
+            self._reload_if_changed()
+            if self._matrix is None or not self._active[:self._size].any():
+                return []
+
+            rows = self._filtered_rows(filter) if filter else self._candidate_rows(query)
+            if rows is not None and not len(rows):
+                return []
+            if rows is None:
+                scores = self._scores(query, 0, self._size)
+                scores[~self._active[:self._size]] = -np.inf
+                rows = np.arange(self._size)
+            else:
+                scores = self._row_scores(query, rows)
+                scores[~self._active[rows]] = -np.inf
+
+            k = min(k, len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            best = [i for i in best if scores[i] != -np.inf]
+            results = [(int(rows[i]), float(scores[i])) for i in best]
+            documents = self._documents_for_rows([row for row, _ in results])
+        return [(documents[row], score) for row, score in results if row in documents]
+
+    def close(self):
+        """
+        Ferme la base annexe et la projection de la matrice.
+        """
+        with self._lock:
+            self._matrix = None
+            self._connection.close()
+
+    def _load(self):
+        """
+        (Re)charge l'état de la base depuis le disque : matrice, lignes actives et version.
+        """
+        self._version = self._read_version()
+        self._matrix = (
+            np.lib.format.open_memmap(self._matrix_path, mode="r+")
+            if os.path.exists(self._matrix_path)
+            else None
+        )
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        rows = [row for (row,) in self._connection.execute("SELECT row FROM rows")]
+        self._size = max(rows) + 1 if rows else 0
+        self._active = np.zeros(max(capacity, self._size), dtype=bool)
+        self._active[rows] = True
+        self._ivf = None
+        self._dirty_rows = set()
+
+    def _reload_if_changed(self):
+        """
+        Recharge l'état de la base si un autre processus l'a modifiée.
+        """
+        if self._read_version() != self._version:
+            self._load()
+
+    def _read_version(self):
+        return self._connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _bump_version(self):
+        """
+        Incrémente la version de la base. Doit être appelée dans une transaction.
+        """
+        self._connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        self._version = self._read_version()
+
+    def _rows_for_ids(self, ids: list[str]):
+        """
+        :return: Dictionnaire identifiant -> ligne pour les identifiants présents dans la base.
+        """
+        found = {}
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._connection.execute(
+                f"SELECT id, row FROM rows WHERE id IN ({placeholders})", batch
+            ))
+        return found
+
+    def _documents_for_rows(self, rows: list[int]):
+        """
+        :return: Dictionnaire ligne -> Document pour les lignes données.
+        """
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        return {
+            row: Document(page_content=document, metadata=json.loads(metadata))
+            for row, document, metadata in self._connection.execute(
+                f"SELECT row, document, metadata FROM rows WHERE row IN ({placeholders})", rows
+            )
+        }
+
+    def _ensure_capacity(self, size: int, dimension: int):
+        """
+        Crée la matrice, ou l'agrandit (en doublant sa capacité) pour contenir `size` vecteurs.
+        """
+        if self._matrix is not None and self._matrix.shape[1] != dimension:
+            raise ValueError(
+                f"Dimension des embeddings ({dimension}) différente de celle de la base ({self._matrix.shape[1]})"
+            )
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if size <= capacity:
+            return
+
+        new_capacity = max(INITIAL_CAPACITY, capacity * 2, size)
+        self._rewrite_matrix(new_capacity, dimension, np.arange(self._size))
+        active = np.zeros(new_capacity, dtype=bool)
+        active[:len(self._active)] = self._active
+        self._active = active
+
+    def _rewrite_matrix(self, capacity: int, dimension: int, rows: np.ndarray):
+        """
+        Réécrit la matrice dans un nouveau fichier (remplacé de manière atomique),
+        en y copiant les lignes données dans l'ordre.
+        """
+        tmp_path = f"{self._matrix_path}.tmp"
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, dimension))
+        for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+            block = rows[start:start + SEARCH_BLOCK_ROWS]
+            matrix[start:start + len(block)] = self._matrix[block]
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, self._matrix_path)
+        self._matrix = np.lib.format.open_memmap(self._matrix_path, mode="r+")
+
+    def _compact(self):
+        """
+        Retire les lignes supprimées de la matrice et renumérote les lignes restantes.
+        """
+        live_rows = np.flatnonzero(self._active[:self._size])
+        print(f"🧹 Compactage de la base vectorielle ({self._size} -> {len(live_rows)} lignes)")
+        capacity = max(INITIAL_CAPACITY, len(live_rows) * 2)
+        self._rewrite_matrix(capacity, self._matrix.shape[1], live_rows)
+        with self._connection:
+            # Les lignes sont renumérotées dans l'ordre croissant : aucun numéro n'est réutilisé avant d'être libéré
+            self._connection.executemany(
+                "UPDATE rows SET row = ? WHERE row = ?",
+                [(new_row, int(old_row)) for new_row, old_row in enumerate(live_rows)],
+            )
+            self._bump_version()
+        self._size = len(live_rows)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._active[:self._size] = True
+        self._ivf = None
+        self._dirty_rows = set()
+
+    def _encode(self, embeddings: list[list[float]]):
+        """
+        :return: Les embeddings normalisés, convertis dans le type de stockage.
+        """
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if self.dtype == np.int8:
+            return np.round(vectors * INT8_SCALE).astype(np.int8)
+        return vectors.astype(self.dtype)
+
+    def _scores(self, query: np.ndarray, start: int, end: int):
+        """
+        :return: Similarités cosinus entre la requête et les lignes [start, end), calculées par blocs.
+        """
+        scores = np.empty(end - start, dtype=np.float32)
+        for block_start in range(start, end, SEARCH_BLOCK_ROWS):
+            block_end = min(end, block_start + SEARCH_BLOCK_ROWS)
+            block = np.asarray(self._matrix[block_start:block_end], dtype=np.float32)
+            scores[block_start - start:block_end - start] = block @ query
+        if self.dtype == np.int8:
+            scores /= INT8_SCALE
+        return scores
+
+    def _row_scores(self, query: np.ndarray, rows: np.ndarray):
+        """
+        :return: Similarités cosinus entre la requête et les lignes données.
+        """
+        scores = np.asarray(self._matrix[rows], dtype=np.float32) @ query
+        if self.dtype == np.int8:
+            scores /= INT8_SCALE
+        return scores
+
+    def _filtered_rows(self, where: dict):
+        """
+        :param where: Filtre sur les métadonnées.
+        :return: Les lignes (triées) qui correspondent au filtre.
+        """
+        sql, params = where_to_sql(where)
+        return np.fromiter(
+            (row for (row,) in self._connection.execute(f"SELECT row FROM rows WHERE {sql} ORDER BY row", params)),
+            dtype=np.int64,
+        )
+
+    def _candidate_rows(self, query: np.ndarray):
+        """
+        Sélectionne les lignes à comparer à la requête grâce à l'index IVF.
+
+        :return: Les lignes candidates, ou None pour une recherche exhaustive (petite base).
+        """
+        active_count = int(self._active[:self._size].sum())
+        if active_count < self.ivf_min_rows:
+            return None
+        if self._ivf is None or self._size - self._ivf.built_size > IVF_REBUILD_RATIO * self._ivf.built_size:
+            self._ivf = IvfIndex.build(self, np.flatnonzero(self._active[:self._size]))
+            self._dirty_rows = set()
+
+        # Les lignes ajoutées ou modifiées depuis la construction de l'index sont toujours comparées
+        rows = [self._ivf.search(query, self.ivf_probes), np.arange(self._ivf.built_size, self._size)]
+        if self._dirty_rows:
+            rows.append(np.fromiter(self._dirty_rows, dtype=np.int64))
+        return np.unique(np.concatenate(rows))
+
+
+class IvfIndex:
+    """
+    Index IVF (inverted file) : les vecteurs sont répartis en partitions autour de centroïdes
+    calculés par k-moyennes sphériques, et une recherche ne parcourt que les partitions
+    dont les centroïdes sont les plus proches de la requête.
+    """
+
+    def __init__(self, centroids: np.ndarray, partitions: list[np.ndarray], built_size: int):
+        self.centroids = centroids
+        self.partitions = partitions
+        self.built_size = built_size
+
+    @classmethod
+    def build(cls, store: NumpyVectorStore, rows: np.ndarray, iterations: int = 10, sample_size: int = 20_000):
+        """
+        Construit l'index à partir des lignes actives de la base.
+
+        :param store: Base vectorielle.
+        :param rows: Lignes à indexer.
+        :param iterations: Nombre d'itérations des k-moyennes.
+        :param sample_size: Nombre de vecteurs utilisés pour calculer les centroïdes.
+        :return: L'index construit.
+        """
+        partition_count = max(1, int(math.sqrt(len(rows))))
+        print(f"🔎 Construction de l'index IVF ({len(rows)} vecteurs, {partition_count} partitions)")
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, size=min(sample_size, len(rows)), replace=False))
+        vectors = _normalize(np.asarray(store._matrix[sample], dtype=np.float32))
+
+        centroids = vectors[rng.choice(len(vectors), size=min(partition_count, len(vectors)), replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = vectors[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        # Affecter toutes les lignes à leur partition, par blocs
+        labels = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+            block = np.asarray(store._matrix[rows[start:start + SEARCH_BLOCK_ROWS]], dtype=np.float32)
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+        partitions = [rows[order[bounds[c]:bounds[c + 1]]] for c in range(len(centroids))]
+        return cls(centroids, partitions, store._size)
+
+    def search(self, query: np.ndarray, probes: int):
+        """
+        :param query: Requête normalisée.
+        :param probes: Nombre de partitions parcourues.
+        :return: Lignes des partitions les plus proches de la requête.
+        """
+        probes = min(probes, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return np.concatenate([self.partitions[c] for c in nearest])
+
+
+def _normalize(vectors: np.ndarray):
+    """
+    :return: Les vecteurs (lignes) ramenés à une norme de 1.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
@@ -1,126 +1,505 @@
-import argparse
 import os
-import shutil
+import threading
 
 from django.conf import settings
 from langchain.schema.document import Document
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from .get_embedding_function import get_embedding_function
+from .answer_cache import clear_answers, invalidate_answers
+from .collection import Collection, get_collection
+from .embedding_pipeline import EmbeddingPipeline
+from .loaders import get_parser_pool, iter_parsed_files, load_pdf_pages
+from .manifest import get_manifest, hash_file
+from .metrics import CHUNKS_DELETED, FILES_INDEXED, PAGES_PARSED, span
+from .splitting import SplitterConfig, assign_chunk_ids, split_pages, split_pages_in_parallel
+from .stats import get_collection_stats, recount_collection_stats, update_collection_stats
 
+# Version des métadonnées des morceaux : les fichiers indexés avec une version antérieure sont
+# réindexés (leurs morceaux sont mis à jour, les embeddings étant repris du cache)
+CHUNK_METADATA_VERSION = 1
 
-def populate_database():
+# Verrous par fichier, pour ne jamais indexer le même fichier deux fois en parallèle
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+def populate_database(progress=None, collection: Collection | None = None):
+    """
+    Synchronise la base de données d'une collection avec les fichiers de son répertoire de données.
+
+    Grâce au manifeste des fichiers indexés, seuls les fichiers nouveaux ou modifiés
+    sont chargés, segmentés et ajoutés. Les morceaux des fichiers modifiés sont remplacés
+    et ceux des fichiers supprimés sont retirés de la base.
+
+    :param progress: Objet optionnel informé de l'avancement (voir `index_file`).
+    :param collection: Collection à synchroniser (collection par défaut si absente).
+    :return: Nombre de fichiers (ré)indexés.
+    """
+    collection = collection or get_collection()
+    with collection.use():
+        manifest = get_manifest(collection)
+        pipeline = EmbeddingPipeline(collection, progress=progress)
+
+        remove_deleted_files(manifest, collection)
+        try:
+            indexed_files = index_files(list_data_files(collection), manifest, collection, pipeline)
+        finally:
+            with manifest.lock:
+                manifest.save()
+            pipeline.report()
+
+        # Recaler les statistiques sur les valeurs exactes une fois la synchronisation terminée
+        recount_collection_stats(collection)
+
+    return indexed_files
+
+
+def remove_deleted_files(manifest, collection: Collection):
+    """
+    Retire de la base les morceaux des fichiers du manifeste qui n'existent plus.
+    Doit être appelée dans un bloc `with collection.use():`.
+
+    :param manifest: Manifeste des fichiers indexés.
+    :param collection: Collection des fichiers.
+    """
+    for file_path in manifest.paths():
+        if not os.path.exists(file_path):
+            with manifest.lock:
+                entry = manifest.remove(file_path)
+                manifest.save()
+            if entry is not None:
+                delete_chunks(collection, entry["chunk_ids"])
+                update_collection_stats(files=-1, collection=collection)
+                print(f"🗑️ Fichier supprimé retiré de la base : {file_path}")
+
+
+def ingest_files(file_paths: list[str], progress=None, collection: Collection | None = None):
+    """
+    Indexe uniquement les fichiers donnés (par exemple ceux qui viennent d'être téléversés).
+
+    Les fichiers sont indexés dans la version de l'index en service au moment de l'exécution. Si une
+    reconstruction publie une nouvelle version pendant l'indexation, ils y sont indexés à leur tour :
+    elle a pu lister le répertoire de données avant leur arrivée.
+
+    :param file_paths: Chemins des fichiers à indexer.
+    :param progress: Objet optionnel informé de l'avancement (voir `index_file`).
+    :param collection: Collection des fichiers (collection par défaut si absente).
+    :return: Nombre de fichiers (ré)indexés.
     """
-    Charge les documents, les segmente en morceaux et les ajoute à la base de données Chroma.
+    collection = collection or get_collection()
+    indexed_files = None
+    while True:
+        with collection.use():
+            version = collection.get_active_version()
+            manifest = get_manifest(collection)
+            pipeline = EmbeddingPipeline(collection, progress=progress)
+
+            try:
+                indexed = index_files(file_paths, manifest, collection, pipeline)
+            finally:
+                pipeline.report()
+            recount_collection_stats(collection)
+        if indexed_files is None:
+            indexed_files = indexed
+        if collection.get_active_version() == version:
+            return indexed_files
+
+
+def index_files(
+    file_paths: list[str],
+    manifest,
+    collection: Collection,
+    pipeline: EmbeddingPipeline,
+    workers: int | None = None,
+):
     """
-    documents = load_documents()
-    chunks = split_documents(documents)
-    add_to_chroma(chunks)
+    Indexe les fichiers nouveaux ou modifiés parmi ceux donnés.
 
+    Les fichiers à indexer sont analysés en parallèle par un pool de processus et indexés
+    au fur et à mesure que leurs pages sont prêtes : seuls les fichiers en cours d'analyse
+    sont gardés en mémoire.
 
-def reset_database():
+    :param file_paths: Chemins des fichiers.
+    :param manifest: Manifeste des fichiers indexés.
+    :param collection: Collection des fichiers.
+    :param pipeline: Pipeline d'intégration des morceaux.
+    :param workers: Nombre de processus d'analyse et de découpage (`PDF_PARSER_WORKERS` si absent).
+    :return: Nombre de fichiers (ré)indexés.
+    """
+    workers = workers or settings.PDF_PARSER_WORKERS
+    # Ne pas analyser les fichiers inchangés depuis leur dernière indexation
+    pending_files = [file_path for file_path in file_paths if needs_indexing(file_path, manifest)]
+
+    indexed_files = 0
+    parsed_files = iter_parsed_files(pending_files, workers)
+    for file_path, documents, error in parsed_files:
+        if error is not None:
+            print(f"🚫 Impossible de charger '{file_path}' : {error}")
+        if index_file(file_path, manifest, collection, pipeline, documents=documents, workers=workers):
+            indexed_files += 1
+    return indexed_files
+
+
+def needs_indexing(file_path: str, manifest):
+    """
+    Vérifie si un fichier est nouveau ou modifié depuis sa dernière indexation.
+
+    Un fichier seulement touché (contenu identique) est mis à jour dans le manifeste
+    sans être réindexé. Un fichier indexé avec d'anciennes métadonnées est réindexé.
+
+    :param file_path: Chemin du fichier.
+    :param manifest: Manifeste des fichiers indexés.
+    :return: True si le fichier doit être (ré)indexé.
+    """
+    if not os.path.exists(file_path):
+        return False
+    entry = manifest.get(file_path)
+    if entry is None or entry.get("metadata_version") != CHUNK_METADATA_VERSION:
+        return True
+    stat = os.stat(file_path)
+    if manifest.is_unchanged(file_path, stat):
+        return False
+
+    # Le fichier a été touché mais son contenu est identique : on met juste à jour le manifeste
+    content_hash = hash_file(file_path)
+    if entry["hash"] == content_hash:
+        with manifest.lock:
+            manifest.set(file_path, stat, content_hash, entry["chunk_ids"], CHUNK_METADATA_VERSION)
+        return False
+    return True
+
+
+def index_file(
+    file_path: str,
+    manifest,
+    collection: Collection,
+    pipeline: EmbeddingPipeline,
+    documents: list[Document] | None = None,
+    workers: int | None = None,
+):
+    """
+    Indexe un fichier s'il est nouveau ou modifié depuis sa dernière indexation.
+
+    Un verrou par fichier garantit qu'un même fichier n'est jamais indexé par deux
+    traitements en même temps. L'objet `progress` du pipeline, s'il est fourni, est informé
+    via `add_pages(n)`, `add_chunks(n)` et `add_embedded(n)`.
+
+    :param file_path: Chemin du fichier.
+    :param manifest: Manifeste des fichiers indexés.
+    :param collection: Collection du fichier.
+    :param pipeline: Pipeline d'intégration des morceaux.
+    :param documents: Pages du fichier déjà analysées (le fichier est chargé si absentes).
+    :param workers: Nombre de processus de découpage (`PDF_PARSER_WORKERS` si absent).
+    :return: True si le fichier a été (ré)indexé.
+    """
+    with get_file_lock(file_path):
+        # Le fichier a pu être supprimé ou indexé par un autre traitement en attendant le verrou
+        if not needs_indexing(file_path, manifest):
+            return False
+        stat = os.stat(file_path)
+        content_hash = hash_file(file_path)
+        entry = manifest.get(file_path)
+
+        try:
+            if documents is None:
+                with span("parse"):
+                    documents = load_file_documents(file_path)
+            with span("split"):
+                chunks = split_documents(documents, workers)
+            add_file_metadata(chunks, file_path, stat)
+        except Exception as e:
+            # Le fichier est enregistré sans morceaux pour ne pas le réanalyser tant qu'il n'est pas modifié
+            print(f"🚫 Impossible de charger '{file_path}' : {e}")
+            documents, chunks = [], []
+
+        # Retirer les morceaux d'un fichier modifié qui n'existent plus : les morceaux
+        # dont le texte est inchangé gardent leur identifiant et leur embedding
+        if entry is not None:
+            new_ids = {chunk.metadata["id"] for chunk in chunks}
+            delete_chunks(collection, [chunk_id for chunk_id in entry["chunk_ids"] if chunk_id not in new_ids])
+        if pipeline.progress is not None:
+            pipeline.progress.add_pages(len(documents))
+        PAGES_PARSED.inc(len(documents))
+        with span("add_to_chroma"):
+            chunk_ids = add_to_chroma(chunks, collection=collection, pipeline=pipeline)
+
+        # Enregistrer le fichier après chaque ajout pour pouvoir reprendre en cas d'interruption
+        with manifest.lock:
+            manifest.set(file_path, stat, content_hash, chunk_ids, CHUNK_METADATA_VERSION)
+            manifest.save()
+        if entry is None:
+            update_collection_stats(files=1, collection=collection)
+        FILES_INDEXED.inc()
+        return True
+
+
+def add_file_metadata(chunks: list[Document], file_path: str, stat: os.stat_result):
+    """
+    Ajoute aux métadonnées des morceaux celles de leur fichier, sur lesquelles les recherches
+    peuvent être filtrées (voir `SearchFilters`) : nom du fichier et date de téléversement.
+
+    :param chunks: Morceaux du fichier.
+    :param file_path: Chemin du fichier.
+    :param stat: Résultat de `os.stat` pour ce fichier.
+    """
+    file_name = os.path.basename(file_path)
+    # Le fichier est écrit au téléversement : sa date de modification est la date de téléversement
+    uploaded_at = int(stat.st_mtime)
+    for chunk in chunks:
+        chunk.metadata["file_name"] = file_name
+        chunk.metadata["uploaded_at"] = uploaded_at
+
+
+def get_file_lock(file_path: str):
+    """
+    Retourne le verrou associé à un fichier (créé au premier appel).
+
+    :param file_path: Chemin du fichier.
+    :return: Le verrou du fichier.
+    """
+    with _file_locks_lock:
+        return _file_locks.setdefault(file_path, threading.Lock())
+
+
+def rebuild_database(progress=None, collection: Collection | None = None):
+    """
+    Reconstruit l'index d'une collection à partir de son répertoire de données dans une nouvelle
+    version, puis la met en service : les requêtes utilisent l'ancienne version pendant toute la
+    construction. Une reconstruction interrompue est reprise là où elle s'était arrêtée.
+
+    :param progress: Objet optionnel informé de l'avancement (voir `index_file`).
+    :param collection: Collection à reconstruire (collection par défaut si absente).
+    :return: Nombre de fichiers indexés.
+    """
+    collection = collection or get_collection()
+    building = collection.new_version(resume=True)
+    indexed_files = populate_database(progress=progress, collection=building)
+    collection.publish(building)
+    clear_answers()
+    # Rattraper les fichiers téléversés pendant la construction : ils ont pu être indexés dans
+    # l'ancienne version après que la nouvelle a listé le répertoire de données
+    indexed_files += populate_database(progress=progress, collection=collection)
+    return indexed_files
+
+
+def reset_database(collection: Collection | None = None):
     """
     Réinitialise complètement la base de données en supprimant tout son contenu.
+
+    :param collection: Collection à réinitialiser (collection par défaut si absente).
     """
-    clear_database()
+    clear_database(collection)
+
+
+def list_data_files(collection: Collection | None = None):
+    """
+    Liste les fichiers PDF présents dans le répertoire de données d'une collection
+    (les fichiers cachés sont ignorés).
+
+    :param collection: Collection (collection par défaut si absente).
+    :return: Liste triée des chemins des fichiers PDF.
+    """
+    data_path = (collection or get_collection()).data_path
+    if not os.path.isdir(data_path):
+        return []
+    return sorted(
+        os.path.join(data_path, name)
+        for name in os.listdir(data_path)
+        if name.lower().endswith(".pdf")
+        and not name.startswith(".")
+        and os.path.isfile(os.path.join(data_path, name))
+    )
 
 
 def load_documents():
     """
     Charge les documents PDF depuis un répertoire spécifié dans les paramètres Django.
-    
-    :return: Liste de documents chargés.
+    Les fichiers sont analysés en parallèle et leurs pages retournées au fur et à mesure.
+
+    :return: Générateur de documents chargés (une page par document).
+    """
+    for file_path, documents, error in iter_parsed_files(list_data_files(), settings.PDF_PARSER_WORKERS):
+        if error is not None:
+            print(f"🚫 Impossible de charger '{file_path}' : {error}")
+        yield from documents
+
+
+def load_file_documents(file_path: str):
+    """
+    Charge les pages d'un fichier PDF.
+
+    :param file_path: Chemin du fichier PDF.
+    :return: Liste de documents (une page par document).
     """
-    document_loader = PyPDFDirectoryLoader(settings.DATA_PATH)
-    return document_loader.load()
+    return load_pdf_pages(file_path)
 
 
-def split_documents(documents: list[Document]):
+def split_documents(documents: list[Document], workers: int | None = None):
     """
-    Divise les documents en morceaux de taille contrôlée pour l'indexation.
+    Divise les documents en morceaux de taille contrôlée pour l'indexation, avec le découpage
+    configuré pour leur type de fichier (`TEXT_SPLITTERS`), et leur attribue un identifiant stable.
+
+    Les fichiers d'au moins `SPLIT_PARALLEL_MIN_PAGES` pages sont découpés en parallèle
+    dans le pool de processus d'analyse.
 
     :param documents: Liste de documents à segmenter.
-    :return: Liste de morceaux de texte segmentés.
+    :param workers: Nombre de processus du pool (`PDF_PARSER_WORKERS` si absent).
+    :return: Liste de morceaux de texte segmentés, dans l'ordre des documents.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,           # Taille maximale d'un morceau (en caractères).
-        chunk_overlap=80,         # Chevauchement entre les morceaux pour la continuité.
-        length_function=len,      # Fonction pour mesurer la longueur des morceaux.
-        is_separator_regex=False, # Indique que le séparateur n'est pas une expression régulière.
-    )
-    return text_splitter.split_documents(documents)
+    workers = workers or settings.PDF_PARSER_WORKERS
+    # Regrouper les pages consécutives d'un même fichier
+    groups = []
+    for document in documents:
+        source = document.metadata.get("source")
+        if groups and groups[-1][0] == source:
+            groups[-1][1].append(document)
+        else:
+            groups.append((source, [document]))
+
+    chunks = []
+    for source, pages in groups:
+        config = get_splitter_config(source or "")
+        if workers > 1 and len(pages) >= settings.SPLIT_PARALLEL_MIN_PAGES:
+            pool = get_parser_pool(workers)
+            chunks.extend(split_pages_in_parallel(pages, config, pool, settings.SPLIT_PAGES_PER_TASK))
+        else:
+            chunks.extend(split_pages(pages, config))
+    return assign_chunk_ids(chunks)
 
 
-def add_to_chroma(chunks: list[Document]):
+def get_splitter_config(file_path: str):
+    """
+    Retourne les paramètres de découpage d'un fichier : ceux de son extension dans `TEXT_SPLITTERS`,
+    complétés par ceux de "default".
+
+    :param file_path: Chemin du fichier.
+    :return: Paramètres du découpage (SplitterConfig).
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    return SplitterConfig(**{
+        **settings.TEXT_SPLITTERS.get("default", {}),
+        **settings.TEXT_SPLITTERS.get(extension, {}),
+    })
+
+
+def add_to_chroma(
+    chunks: list[Document],
+    collection: Collection | None = None,
+    pipeline: EmbeddingPipeline | None = None,
+):
     """
     Ajoute des morceaux de texte à la base de données Chroma.
     Évite d'ajouter des documents déjà présents dans la base.
 
+    Les embeddings sont calculés par lots via le pipeline d'intégration : chaque lot
+    est enregistré dès qu'il est prêt, si bien qu'une nouvelle exécution après une
+    interruption ne recalcule que les morceaux manquants.
+
     :param chunks: Liste de morceaux de texte à ajouter.
+    :param collection: Collection à utiliser (collection par défaut si absente).
+    :param pipeline: Pipeline d'intégration à utiliser (un nouveau pipeline est créé si absent,
+                     et son débit est affiché à la fin).
+    :return: Liste des identifiants de tous les morceaux.
     """
-    # Charger la base de données existante
-    db = Chroma(
-        persist_directory=settings.CHROMA_PATH,
-        embedding_function=get_embedding_function(),
-    )
+    collection = collection or get_collection()
+    with collection.use():
+        return _add_to_chroma(chunks, collection, pipeline)
+
+
+def _add_to_chroma(chunks: list[Document], collection: Collection, pipeline: EmbeddingPipeline | None):
+    """
+    Ajoute des morceaux à la base d'une collection (voir `add_to_chroma`).
+    Doit être appelée dans un bloc `with collection.use():`.
+    """
+    db = collection.get_vector_store()
 
-    # Calculer les identifiants uniques pour chaque morceau
-    chunks_with_ids = calculate_chunk_ids(chunks)
+    # Calculer les identifiants (dérivés du contenu) des morceaux qui n'en ont pas encore
+    if any("id" not in chunk.metadata for chunk in chunks):
+        assign_chunk_ids(chunks)
+    chunk_ids = [chunk.metadata["id"] for chunk in chunks]
+    if not chunk_ids:
+        return []
 
-    # Vérifier les documents existants dans la base
-    existing_items = db.get(include=[])
-    existing_ids = set(existing_items["ids"])
-    print(f"Nombre de documents existants dans la base : {len(existing_ids)}")
+    # Vérifier, parmi ces morceaux, ceux déjà présents dans la base
+    existing = db.get(ids=chunk_ids, include=["metadatas"])
+    existing_metadatas = dict(zip(existing["ids"], existing["metadatas"]))
+    print(f"Nombre de morceaux déjà présents dans la base : {len(existing_metadatas)}")
 
-    # Ajouter uniquement les nouveaux documents
-    new_chunks = [chunk for chunk in chunks_with_ids if chunk.metadata["id"] not in existing_ids]
+    # Ajouter les nouveaux morceaux, et mettre à jour ceux dont les métadonnées ont changé
+    # (position dans la page) : leur texte est inchangé, l'embedding est repris du cache
+    new_chunks = [chunk for chunk in chunks if existing_metadatas.get(chunk.metadata["id"]) != chunk.metadata]
 
     if new_chunks:
         print(f"👉 Ajout de nouveaux documents : {len(new_chunks)}")
-        new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
-        db.add_documents(new_chunks, ids=new_chunk_ids)
+        # Initialiser les statistiques avant l'ajout, pour que les lots ne soient pas comptés deux fois
+        get_collection_stats(collection)
+        if pipeline is not None and pipeline.progress is not None:
+            pipeline.progress.add_chunks(len(new_chunks))
+        if pipeline is None:
+            standalone_pipeline = EmbeddingPipeline(collection)
+            standalone_pipeline.run(new_chunks)
+            standalone_pipeline.report()
+        else:
+            pipeline.run(new_chunks)
     else:
         print("✅ Aucun nouveau document à ajouter")
 
+    return chunk_ids
 
-def calculate_chunk_ids(chunks):
+
+def delete_chunks(collection: Collection, chunk_ids: list[str]):
     """
-    Calcule des identifiants uniques pour chaque morceau basé sur la source, la page et l'index.
+    Supprime des morceaux de la base de données d'une collection à partir de leurs identifiants.
+    Doit être appelée dans un bloc `with collection.use():`.
 
-    :param chunks: Liste de morceaux de texte.
-    :return: Liste de morceaux avec des identifiants ajoutés.
+    :param collection: Collection des morceaux.
+    :param chunk_ids: Identifiants des morceaux à supprimer.
     """
-    last_page_id = None
-    current_chunk_index = 0
+    if chunk_ids:
+        collection.get_vector_store().delete(ids=chunk_ids)
+        collection.get_lexical_index().delete(chunk_ids)
+        update_collection_stats(chunks=-len(chunk_ids), collection=collection)
+        CHUNKS_DELETED.inc(len(chunk_ids))
+        invalidate_answers(chunk_ids)
 
-    for chunk in chunks:
-        source = chunk.metadata.get("source")  # Source du document (par exemple, le nom du fichier PDF).
-        page = chunk.metadata.get("page")     # Numéro de la page.
-        current_page_id = f"{source}:{page}"  # ID unique pour la page (source:page).
 
-        # Incrémente l'index si le morceau appartient à la même page que le précédent.
-        if current_page_id == last_page_id:
-            current_chunk_index += 1
-        else:
-            current_chunk_index = 0
+def delete_file_chunks(file_name: str, collection: Collection | None = None):
+    """
+    Supprime de la base tous les morceaux des fichiers portant ce nom.
 
-        # Génère un ID unique pour le morceau.
-        chunk_id = f"{current_page_id}:{current_chunk_index}"
-        last_page_id = current_page_id
+    Les morceaux sont retrouvés grâce au manifeste (index fichier -> morceaux),
+    puis supprimés en une seule opération.
 
-        # Ajoute l'ID au metadata du morceau.
-        chunk.metadata["id"] = chunk_id
+    :param file_name: Nom exact du fichier (par exemple "mon_fichier.pdf").
+    :param collection: Collection du fichier (collection par défaut si absente).
+    :return: Nombre de morceaux supprimés.
+    """
+    collection = collection or get_collection()
+    if not collection.exists():
+        return 0
+    manifest = get_manifest(collection)
+    with manifest.lock:
+        file_paths = manifest.find(file_name)
+        entries = [manifest.remove(file_path) for file_path in file_paths]
+        if file_paths:
+            manifest.save()
 
-    return chunks
+    chunk_ids = [chunk_id for entry in entries for chunk_id in entry["chunk_ids"]]
+    with collection.use():
+        delete_chunks(collection, chunk_ids)
+        recount_collection_stats(collection)
+    return len(chunk_ids)
 
 
-def clear_database():
+def clear_database(collection: Collection | None = None):
     """
-    Supprime complètement le contenu de la base de données Chroma en effaçant le dossier correspondant.
+    Vide la base de données d'une collection en publiant une nouvelle version vide de son index.
+    Les requêtes en cours terminent sur l'ancienne version, supprimée du disque dès qu'elle n'est
+    plus utilisée.
 
+    :param collection: Collection à vider (collection par défaut si absente).
     :return: None
     """
-    if os.path.exists(settings.CHROMA_PATH):
-        shutil.rmtree(settings.CHROMA_PATH)
\ No newline at end of file
+    collection = collection or get_collection()
+    clear_answers()
+    if collection.exists():
+        collection.publish(collection.new_version())
\ No newline at end of file
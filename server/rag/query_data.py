@@ -1,61 +1,228 @@
 import argparse
+import asyncio
+import logging
+import random
 import subprocess
 
 from django.conf import settings
 from langchain.prompts import ChatPromptTemplate
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaLLM
 
-from .get_embedding_function import get_embedding_function
+from .answer_cache import get_answer_cache
+from .collection import Collection, get_collection
+from .context import build_context, count_tokens
+from .filters import SearchFilters
+from .metrics import PROMPT_TOKENS, QUERIES, ainstrument_stream, instrument_stream, span
+from .query_embeddings import get_query_embedder
+from .resources import get_llm
+from .rerank import get_candidate_count, rerank
+from .retrieval import retrieve
+from .stats import get_collection_stats
 
+logger = logging.getLogger(__name__)
 
-def query_rag(query_text: str):
+# Message retourné lorsque la base de connaissances ne contient aucun document
+EMPTY_DATABASE_MESSAGE = "Désolé, la base de connaissances est vide. Veuillez ajouter des documents avant de poser une question."
+
+
+def query_rag(query_text: str, collection: Collection | None = None, filters: SearchFilters | None = None):
     """
     Fonction pour interroger un système RAG (Retrieval-Augmented Generation).
     Utilise une base de connaissances (Chroma) et un modèle de langage (OllamaLLM)
-    pour répondre à une question donnée en fonction de documents similaires.
+    pour répondre à une question donnée en fonction de documents pertinents
+    (recherche vectorielle, lexicale ou hybride, voir `RETRIEVAL_MODE`).
 
     :param query_text: Texte de la requête utilisateur.
+    :param collection: Collection interrogée (collection par défaut si absente) : seuls ses documents sont cherchés.
+    :param filters: Filtres optionnels (fichiers, pages, date de téléversement) appliqués pendant la recherche.
     :return: Un générateur de réponse (streaming) et une liste des sources utilisées.
     """
-    # Préparer la fonction d'embedding et la base de données
-    embedding_function = get_embedding_function()
-    db = Chroma(
-        persist_directory=settings.CHROMA_PATH, embedding_function=embedding_function
-    )
-    num_documents = len(db.get()["documents"])  # Nombre de documents dans la base
+    collection = collection or get_collection()
+    num_documents = get_collection_stats(collection)["chunks"]  # Nombre de morceaux dans la base (en temps constant)
 
     if num_documents == 0:
         # Gérer le cas où la base de données est vide
-        message = "Désolé, la base de connaissances est vide. Veuillez ajouter des documents avant de poser une question."
         # Retourner un générateur qui yield le message d'erreur
-        return iter([message]), []
+        return iter([EMPTY_DATABASE_MESSAGE]), []
 
     # Limiter le nombre de documents retournés pour la recherche par similarité
     k = min(5, num_documents)
-    results = db.similarity_search_with_score(
-        query_text, k=k
-    )  # Recherche des documents les plus proches
-
-    # Générer le contexte à partir des documents similaires
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _ in results])
-    prompt_template = ChatPromptTemplate.from_template(
-        settings.PROMPT_TEMPLATE
-    )  # Charger le modèle de prompt
-    prompt = prompt_template.format(
-        context=context_text, question=query_text
-    )  # Insérer le contexte et la question dans le prompt
-
-    # Afficher le prompt
-    print(f"Prompt:\n{prompt}")
-
-    # Charger le modèle de langage configuré
-    model_name = settings.LANGUAGE_MODEL_NAME
-    model = OllamaLLM(model=model_name)
-
-    # Retourner un générateur qui stream la réponse
-    response_generator = model.stream(prompt)
+    with span("embed_query"):
+        query_embedding = get_query_embedder().embed(query_text)
+    where = filters.to_where() if filters else None
+    results = search_chunks(collection, query_text, query_embedding, k, where)  # Recherche des documents les plus pertinents
     sources = [
         doc.metadata.get("id", "") for doc, _ in results
     ]  # Extraire les identifiants des documents sources
+
+    # Réutiliser la réponse d'une question proche s'appuyant sur les mêmes morceaux
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        cached = answer_cache.lookup(query_embedding, sources)
+        if cached is not None:
+            QUERIES.inc(cache="hit")
+            return iter(cached.response), cached.sources
+    QUERIES.inc(cache="miss")
+
+    prompt = build_prompt(query_text, results)
+
+    # Récupérer le modèle de langage partagé par le processus
+    model = get_llm()
+
+    # Retourner un générateur qui stream la réponse
+    response_generator = instrument_stream(model.stream(prompt))
+    if answer_cache is not None:
+        response_generator = record_response(
+            response_generator,
+            lambda response: answer_cache.store(query_embedding, sources, response, sources),
+        )
     return response_generator, sources
+
+
+async def aquery_rag(query_text: str, collection: Collection | None = None, filters: SearchFilters | None = None):
+    """
+    Version asynchrone de `query_rag`, pour les vues asynchrones (ASGI).
+
+    L'embedding de la requête est attendu sans bloquer (il est calculé par lots avec ceux
+    des requêtes simultanées), la génération de la réponse est faite par le client asynchrone
+    d'Ollama, et la recherche est exécutée dans un thread pour ne pas bloquer la boucle d'événements.
+
+    :param query_text: Texte de la requête utilisateur.
+    :param collection: Collection interrogée (collection par défaut si absente).
+    :param filters: Filtres optionnels appliqués pendant la recherche (voir `query_rag`).
+    :return: Un générateur asynchrone de réponse (streaming) et une liste des sources utilisées.
+    """
+    collection = collection or get_collection()
+    # La lecture des statistiques peut accéder au disque : elle est faite dans un thread
+    num_documents = (await asyncio.to_thread(get_collection_stats, collection))["chunks"]
+
+    if num_documents == 0:
+        return replay_response([EMPTY_DATABASE_MESSAGE]), []
+
+    k = min(5, num_documents)
+    with span("embed_query"):
+        query_embedding = await get_query_embedder().aembed(query_text)
+    where = filters.to_where() if filters else None
+    results = await asyncio.to_thread(search_chunks, collection, query_text, query_embedding, k, where)
+
+    sources = [doc.metadata.get("id", "") for doc, _ in results]
+
+    # Réutiliser la réponse d'une question proche s'appuyant sur les mêmes morceaux
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        cached = answer_cache.lookup(query_embedding, sources)
+        if cached is not None:
+            QUERIES.inc(cache="hit")
+            return replay_response(cached.response), cached.sources
+    QUERIES.inc(cache="miss")
+
+    prompt = build_prompt(query_text, results)
+
+    # Le générateur asynchrone ne lance la génération qu'à la première itération
+    response_generator = ainstrument_stream(get_llm().astream(prompt))
+    if answer_cache is not None:
+        response_generator = arecord_response(
+            response_generator,
+            lambda response: answer_cache.store(query_embedding, sources, response, sources),
+        )
+    return response_generator, sources
+
+
+def search_chunks(collection: Collection, query_text: str, query_embedding: list[float], k: int, where: dict | None = None):
+    """
+    Recherche des candidats dans une collection puis les reclasse pour ne garder que
+    les `k` plus pertinents (voir `RERANK_MODE`).
+
+    :param collection: Collection interrogée.
+    :param query_text: Texte de la requête utilisateur.
+    :param query_embedding: Embedding de la requête.
+    :param k: Nombre de morceaux à retourner.
+    :param where: Filtre optionnel sur les métadonnées des morceaux.
+    :return: Liste de couples (document, score), du plus au moins pertinent.
+    """
+    with span("retrieve"), collection.use():
+        candidates = retrieve(collection, query_text, query_embedding, get_candidate_count(k), where)
+    with span("rerank"):
+        return rerank(query_text, candidates, k)
+
+
+async def replay_response(chunks: list[str]):
+    """
+    Rejoue une réponse déjà connue sous la forme d'un générateur asynchrone.
+
+    :param chunks: Morceaux de la réponse.
+    """
+    for chunk in chunks:
+        yield chunk
+
+
+def record_response(response_generator, on_complete):
+    """
+    Transmet les morceaux d'une réponse en les conservant, puis appelle `on_complete`
+    avec la réponse complète. Une réponse interrompue n'est pas transmise.
+
+    :param response_generator: Générateur de la réponse.
+    :param on_complete: Fonction appelée avec la liste des morceaux de la réponse.
+    """
+    response = []
+    try:
+        for chunk in response_generator:
+            response.append(chunk)
+            yield chunk
+    finally:
+        response_generator.close()
+    on_complete(response)
+
+
+async def arecord_response(response_generator, on_complete):
+    """
+    Version asynchrone de `record_response`.
+
+    :param response_generator: Générateur asynchrone de la réponse.
+    :param on_complete: Fonction appelée avec la liste des morceaux de la réponse.
+    """
+    response = []
+    try:
+        async for chunk in response_generator:
+            response.append(chunk)
+            yield chunk
+    finally:
+        # Fermer le flux interrompt la génération si la réponse est abandonnée
+        await response_generator.aclose()
+    on_complete(response)
+
+
+def build_prompt(query_text: str, results):
+    """
+    Construit le prompt envoyé au modèle de langage à partir des documents similaires.
+
+    :param query_text: Texte de la requête utilisateur.
+    :param results: Liste de couples (document, score) retournés par la recherche.
+    :return: Le prompt formaté.
+    """
+    with span("build_prompt"):
+        # Générer le contexte à partir des documents similaires, dans la limite du budget de tokens
+        context_text = build_context(results)
+        prompt_template = ChatPromptTemplate.from_template(
+            settings.PROMPT_TEMPLATE
+        )  # Charger le modèle de prompt
+        prompt = prompt_template.format(
+            context=context_text, question=query_text
+        )  # Insérer le contexte et la question dans le prompt
+        PROMPT_TOKENS.inc(count_tokens(prompt))
+
+    log_prompt(prompt)
+    return prompt
+
+
+def log_prompt(prompt: str):
+    """
+    Journalise (niveau DEBUG) une partie des prompts, tronqués à `PROMPT_LOG_MAX_CHARS` caractères.
+    La proportion de prompts journalisés est donnée par `PROMPT_LOG_SAMPLE_RATE`.
+
+    :param prompt: Prompt envoyé au modèle de langage.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= settings.PROMPT_LOG_SAMPLE_RATE:
+        return
+    max_chars = settings.PROMPT_LOG_MAX_CHARS
+    truncated = f"{prompt[:max_chars]}… [{len(prompt) - max_chars} caractères tronqués]" if len(prompt) > max_chars else prompt
+    logger.debug("Prompt (%d caractères) :\n%s", len(prompt), truncated)
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+from .embedding_cache import normalize_text
+from .resources import get_shared_embedding_function
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+class QueryEmbedder:
+    """
+    Calcule les embeddings des questions en regroupant les requêtes simultanées.
+
+    Les questions récentes sont servies par un cache LRU en mémoire. Les autres sont mises
+    en attente pendant au plus `window` secondes (ou jusqu'à `max_batch` questions), puis
+    intégrées en un seul appel au modèle ; chaque appelant reçoit l'embedding de sa question.
+    """
+
+    def __init__(self, embeddings: Embeddings, window: float, max_batch: int, cache_size: int):
+        self.embeddings = embeddings
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self._cache = OrderedDict()  # texte normalisé -> embedding, du moins au plus récemment utilisé
+        self._pending = []  # couples (texte normalisé, Future) en attente d'intégration
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str):
+        """
+        :param text: Texte de la question.
+        :return: L'embedding de la question.
+        """
+        return self.submit(text).result()
+
+    async def aembed(self, text: str):
+        """
+        Version asynchrone de `embed`, qui ne bloque pas la boucle d'événements.
+
+        :param text: Texte de la question.
+        :return: L'embedding de la question.
+        """
+        return await asyncio.wrap_future(self.submit(text))
+
+    def submit(self, text: str):
+        """
+        Demande l'embedding d'une question.
+
+        :param text: Texte de la question.
+        :return: Un Future qui recevra l'embedding.
+        """
+        key = normalize_text(text)
+        future = Future()
+        with self._condition:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                future.set_result(vector)
+                return future
+            self.misses += 1
+            self._pending.append((key, future))
+            self._condition.notify()
+        return future
+
+    def stats(self):
+        """
+        :return: Statistiques (succès et échecs du cache, nombre d'appels groupés au modèle).
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "batches": self.batches,
+            "entries": len(self._cache),
+        }
+
+    def _run(self):
+        """
+        Boucle du thread de regroupement : attend la première question, laisse la fenêtre
+        se remplir, puis intègre le lot.
+        """
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                self._pending = self._pending[self.max_batch:]
+            # Ignorer les demandes annulées (client déconnecté) : les autres ne peuvent plus l'être
+            batch = [(key, future) for key, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._embed_batch(batch)
+            except Exception as e:
+                # Un lot ne doit jamais arrêter le thread : les appelants restants reçoivent l'erreur
+                print(f"🚫 Échec de l'intégration d'un lot de questions : {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _embed_batch(self, batch: list):
+        """
+        Intègre un lot de questions en un seul appel et transmet les résultats aux appelants.
+
+        :param batch: Couples (texte normalisé, Future) dont l'exécution a commencé.
+        """
+        # Une même question posée plusieurs fois n'est intégrée qu'une fois
+        texts = list(dict.fromkeys(key for key, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._condition:
+            self.batches += 1
+            for key, vector in vectors.items():
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for key, future in batch:
+            future.set_result(vectors[key])
+
+
+def get_query_embedder():
+    """
+    Retourne le regroupeur d'embeddings de questions partagé par le processus.
+
+    :return: L'instance de QueryEmbedder (créée au premier appel).
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = QueryEmbedder(
+                get_shared_embedding_function(),
+                window=settings.QUERY_EMBEDDING_BATCH_WINDOW_MS / 1000,
+                max_batch=settings.QUERY_EMBEDDING_MAX_BATCH,
+                cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            )
+        return _embedder
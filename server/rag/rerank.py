@@ -0,0 +1,176 @@
+import math
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+
+from django.conf import settings
+
+from .retrieval import reciprocal_rank_fusion
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # Le reclassement par cross-encoder est optionnel
+    CrossEncoder = None
+
+# Paramètres du score BM25 utilisé par le reclassement lexical
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Nombre de couples (question, morceau) évalués par appel au cross-encoder
+CROSS_ENCODER_BATCH_SIZE = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class RerankTimeout(Exception):
+    """
+    Levée lorsque le reclassement dépasse le temps alloué.
+    """
+
+
+def get_candidate_count(k: int):
+    """
+    :param k: Nombre de morceaux envoyés au modèle de langage.
+    :return: Nombre de candidats à rechercher avant le reclassement.
+    """
+    if settings.RERANK_MODE == "off":
+        return k
+    return max(k, settings.RERANK_CANDIDATES)
+
+
+def rerank(query_text: str, results, k: int):
+    """
+    Reclasse les candidats de la recherche et garde les `k` plus pertinents, selon `RERANK_MODE` :
+
+    - "off" : ordre de la recherche ;
+    - "lexical" : fusion de l'ordre de la recherche et d'un score BM25 calculé sur les candidats ;
+    - "cross-encoder" : score d'un modèle local (sentence-transformers, exécuté sur CPU).
+
+    Le reclassement dispose de `RERANK_TIME_BUDGET_MS` millisecondes : au-delà, ou en cas
+    d'erreur, l'ordre de la recherche est conservé.
+
+    :param query_text: Texte de la requête utilisateur.
+    :param results: Candidats de la recherche (couples (document, score)), du plus au moins pertinent.
+    :param k: Nombre de morceaux à retourner.
+    :return: Liste de couples (document, score), du plus au moins pertinent.
+    """
+    mode = settings.RERANK_MODE
+    if mode == "off" or len(results) <= 1:
+        return results[:k]
+    if mode == "lexical":
+        scorer = lexical_scores
+    elif mode == "cross-encoder":
+        scorer = cross_encoder_scores
+    else:
+        raise ValueError(f"Mode de reclassement inconnu : {mode}")
+
+    budget = settings.RERANK_TIME_BUDGET_MS / 1000
+    deadline = time.monotonic() + budget
+    texts = [doc.page_content for doc, _ in results]
+    future = get_rerank_executor().submit(scorer, query_text, texts, deadline)
+    try:
+        scores = future.result(timeout=budget)
+    except (FutureTimeoutError, RerankTimeout):
+        future.cancel()
+        print(f"⏱️ Reclassement abandonné (plus de {settings.RERANK_TIME_BUDGET_MS} ms), ordre de la recherche conservé")
+        return results[:k]
+    except Exception as e:
+        print(f"🚫 Échec du reclassement, ordre de la recherche conservé : {e}")
+        return results[:k]
+
+    reranked = sorted(zip(results, scores), key=lambda item: item[1], reverse=True)
+    if mode == "lexical":
+        # Le score lexical seul ignorerait la proximité sémantique : on fusionne les deux ordres
+        return reciprocal_rank_fusion([results, [result for result, _ in reranked]], k)
+    return [(doc, score) for (doc, _), score in reranked[:k]]
+
+
+def lexical_scores(query_text: str, texts: list[str], deadline: float):
+    """
+    Calcule le score BM25 de chaque texte pour la requête, les statistiques (fréquence
+    des termes, longueur moyenne) étant calculées sur les seuls candidats.
+
+    :param query_text: Texte de la requête.
+    :param texts: Textes des candidats.
+    :param deadline: Heure limite (`time.monotonic()`).
+    :return: Liste des scores, dans l'ordre des textes.
+    """
+    query_terms = set(tokenize(query_text))
+    documents = [tokenize(text) for text in texts]
+    average_length = sum(len(terms) for terms in documents) / len(documents) or 1
+
+    document_frequency = {term: sum(term in terms for terms in documents) for term in query_terms}
+    scores = []
+    for terms in documents:
+        if time.monotonic() > deadline:
+            raise RerankTimeout()
+        score = 0.0
+        for term in query_terms:
+            frequency = terms.count(term)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(documents) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * len(terms) / average_length)
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        scores.append(score)
+    return scores
+
+
+def cross_encoder_scores(query_text: str, texts: list[str], deadline: float):
+    """
+    Calcule le score de pertinence de chaque texte avec le cross-encoder, par lots,
+    en s'arrêtant si l'heure limite est dépassée.
+
+    :param query_text: Texte de la requête.
+    :param texts: Textes des candidats.
+    :param deadline: Heure limite (`time.monotonic()`).
+    :return: Liste des scores, dans l'ordre des textes.
+    """
+    model = get_cross_encoder()
+    scores = []
+    for i in range(0, len(texts), CROSS_ENCODER_BATCH_SIZE):
+        if time.monotonic() > deadline:
+            raise RerankTimeout()
+        batch = texts[i:i + CROSS_ENCODER_BATCH_SIZE]
+        scores.extend(float(score) for score in model.predict([(query_text, text) for text in batch]))
+    return scores
+
+
+@lru_cache(maxsize=None)
+def get_cross_encoder():
+    """
+    :return: Le cross-encoder configuré par `RERANK_MODEL` (chargé au premier appel).
+    """
+    if CrossEncoder is None:
+        raise RuntimeError("le paquet sentence-transformers n'est pas installé")
+    return CrossEncoder(settings.RERANK_MODEL, device="cpu")
+
+
+def get_rerank_executor():
+    """
+    :return: Le pool de threads qui exécute les reclassements, de `RERANK_MAX_WORKERS` threads (créé au premier appel).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RERANK_MAX_WORKERS, thread_name_prefix="rerank"
+            )
+        return _executor
+
+
+def tokenize(text: str):
+    """
+    Découpe un texte en mots, en minuscules et sans accents.
+
+    :param text: Texte à découper.
+    :return: Liste des mots.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"\w+", text)
@@ -0,0 +1,100 @@
+import threading
+
+from chromadb.api.client import SharedSystemClient
+from django.conf import settings
+from langchain_chroma import Chroma
+from langchain_ollama import OllamaLLM
+
+from .get_embedding_function import get_embedding_function, get_ollama_client_kwargs
+from .numpy_store import NumpyVectorStore
+
+# Ressources partagées par tout le processus, créées à la première utilisation
+_lock = threading.Lock()
+_embedding_function = None
+_llm = None
+
+
+class ChromaVectorStore(Chroma):
+    """
+    Base Chroma complétée des méthodes communes aux bases vectorielles de l'application
+    (voir `NumpyVectorStore`).
+    """
+
+    def upsert(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        """
+        Ajoute des morceaux dont les embeddings sont déjà calculés, ou remplace ceux qui ont ces identifiants.
+        """
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def count(self):
+        """
+        :return: Nombre de morceaux dans la base.
+        """
+        return self._collection.count()
+
+    def close(self):
+        """
+        Arrête le client Chroma du dossier de la base, pour libérer sa mémoire et ses fichiers.
+        """
+        # Chroma conserve un client par dossier : on l'oublie pour repartir d'un dossier neuf
+        system = SharedSystemClient._identifier_to_system.pop(self._persist_directory, None)
+        if system is not None:
+            system.stop()
+
+
+def get_shared_embedding_function():
+    """
+    Retourne la fonction d'embedding partagée par le processus.
+
+    :return: La fonction d'embedding (créée au premier appel).
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        with _lock:
+            if _embedding_function is None:
+                _embedding_function = get_embedding_function()
+    return _embedding_function
+
+
+def create_vector_store(embedding_function, path: str):
+    """
+    Ouvre la base vectorielle configurée par `VECTOR_STORE_BACKEND` :
+    Chroma ("chroma") ou matrice NumPy projetée en mémoire ("numpy").
+
+    :param embedding_function: Fonction d'embedding de la base.
+    :param path: Dossier de la base (voir `Collection`).
+    :return: La base vectorielle.
+    """
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "chroma":
+        return ChromaVectorStore(
+            persist_directory=path,
+            embedding_function=embedding_function,
+        )
+    if backend == "numpy":
+        return NumpyVectorStore(
+            path,
+            embedding_function,
+            dtype=settings.VECTOR_STORE_DTYPE,
+            ivf_min_rows=settings.VECTOR_STORE_IVF_MIN_ROWS,
+            ivf_probes=settings.VECTOR_STORE_IVF_PROBES,
+        )
+    raise ValueError(f"Base vectorielle inconnue : {backend}")
+
+
+def get_llm():
+    """
+    Retourne le modèle de langage partagé par le processus.
+
+    :return: L'instance d'OllamaLLM (créée au premier appel).
+    """
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                _llm = OllamaLLM(
+                    model=settings.LANGUAGE_MODEL_NAME,
+                    base_url=settings.OLLAMA_BASE_URL,
+                    client_kwargs=get_ollama_client_kwargs(),
+                )
+    return _llm
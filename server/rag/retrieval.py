@@ -0,0 +1,58 @@
+from django.conf import settings
+
+from .collection import Collection
+
+# Constante de la fusion par rang réciproque : atténue l'écart entre les premiers rangs
+RRF_K = 60
+
+
+def retrieve(collection: Collection, query_text: str, query_embedding: list[float], k: int, where: dict | None = None):
+    """
+    Recherche les morceaux les plus pertinents pour une question, selon `RETRIEVAL_MODE` :
+
+    - "vector" : recherche par similarité des embeddings ;
+    - "lexical" : recherche BM25 dans l'index lexical ;
+    - "hybrid" : fusion des deux classements par rang réciproque (RRF).
+
+    :param collection: Collection interrogée (dans un bloc `with collection.use():`).
+    :param query_text: Texte de la requête utilisateur.
+    :param query_embedding: Embedding de la requête.
+    :param k: Nombre de morceaux à retourner.
+    :param where: Filtre optionnel sur les métadonnées (syntaxe "where" de Chroma), appliqué
+                  pendant la recherche par chaque index plutôt qu'après.
+    :return: Liste de couples (document, score), du plus au moins pertinent.
+    """
+    mode = settings.RETRIEVAL_MODE
+    db = collection.get_vector_store()
+    if mode == "vector":
+        return db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k, filter=where)
+    if mode == "lexical":
+        return collection.get_lexical_index().search(query_text, k, where)
+    if mode != "hybrid":
+        raise ValueError(f"Mode de recherche inconnu : {mode}")
+
+    # Chaque recherche propose plus de candidats que nécessaire, la fusion garde les meilleurs
+    candidates = max(k, settings.RETRIEVAL_CANDIDATES)
+    vector_results = db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=candidates, filter=where)
+    lexical_results = collection.get_lexical_index().search(query_text, candidates, where)
+    return reciprocal_rank_fusion([vector_results, lexical_results], k)
+
+
+def reciprocal_rank_fusion(rankings: list[list], k: int):
+    """
+    Fusionne plusieurs classements de morceaux : chaque morceau reçoit la somme de
+    1 / (RRF_K + rang) sur les classements où il apparaît.
+
+    :param rankings: Classements à fusionner (listes de couples (document, score)).
+    :param k: Nombre de morceaux à retourner.
+    :return: Liste de couples (document, score RRF), du plus au moins pertinent.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            chunk_id = doc.metadata.get("id", "")
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (RRF_K + rank)
+            documents.setdefault(chunk_id, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(documents[chunk_id], scores[chunk_id]) for chunk_id in best]
@@ -0,0 +1,103 @@
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+
+from langchain.schema.document import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .context import CHARS_PER_TOKEN
+
+try:
+    import tiktoken
+except ImportError:  # Sans tiktoken, la longueur en tokens est estimée à partir du nombre de caractères
+    tiktoken = None
+
+
+@dataclass(frozen=True)
+class SplitterConfig:
+    """
+    Paramètres du découpage d'un type de fichier. Ce module est utilisé dans les processus
+    du pool d'analyse : il ne doit pas dépendre de la configuration Django.
+    """
+
+    chunk_size: int = 800  # Taille maximale d'un morceau (dans l'unité `length_unit`)
+    chunk_overlap: int = 80  # Chevauchement entre les morceaux pour la continuité
+    length_unit: str = "characters"  # "characters" ou "tokens"
+    encoding: str = "cl100k_base"  # Encodage tiktoken, si la longueur est mesurée en tokens
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(config: SplitterConfig):
+    """
+    Retourne le découpeur correspondant à une configuration (créé une seule fois par processus).
+
+    :param config: Paramètres du découpage.
+    :return: Le RecursiveCharacterTextSplitter.
+    """
+    chunk_size, chunk_overlap, length_function = config.chunk_size, config.chunk_overlap, len
+    if config.length_unit == "tokens":
+        if tiktoken is None:
+            # Estimation : les tailles en tokens sont converties en caractères
+            chunk_size, chunk_overlap = chunk_size * CHARS_PER_TOKEN, chunk_overlap * CHARS_PER_TOKEN
+        else:
+            encoding = tiktoken.get_encoding(config.encoding)
+            length_function = lambda text: len(encoding.encode(text))  # noqa: E731
+    elif config.length_unit != "characters":
+        raise ValueError(f"Unité de longueur inconnue : {config.length_unit!r}")
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=length_function,
+        is_separator_regex=False, # Indique que le séparateur n'est pas une expression régulière.
+        add_start_index=True,     # Position du morceau dans la page, pour fusionner les morceaux voisins.
+    )
+
+
+def split_pages(pages: list[Document], config: SplitterConfig):
+    """
+    Découpe des pages en morceaux. Exécutée dans un processus du pool pour les gros fichiers.
+
+    :param pages: Pages à découper.
+    :param config: Paramètres du découpage.
+    :return: Liste de morceaux, dans l'ordre des pages.
+    """
+    return get_text_splitter(config).split_documents(pages)
+
+
+def split_pages_in_parallel(pages: list[Document], config: SplitterConfig, pool, group_size: int):
+    """
+    Découpe des pages en morceaux en répartissant des groupes de pages sur un pool de processus.
+
+    :param pages: Pages à découper.
+    :param config: Paramètres du découpage.
+    :param pool: Pool de processus (ProcessPoolExecutor).
+    :param group_size: Nombre de pages envoyées à la fois à un processus.
+    :return: Liste de morceaux, dans l'ordre des pages.
+    """
+    futures = [
+        pool.submit(split_pages, pages[i:i + group_size], config)
+        for i in range(0, len(pages), group_size)
+    ]
+    return [chunk for future in futures for chunk in future.result()]
+
+
+def assign_chunk_ids(chunks: list[Document]):
+    """
+    Attribue à chaque morceau un identifiant dérivé de son contenu : "source:page:empreinte".
+
+    Un morceau dont le texte ne change pas garde son identifiant (et donc son embedding) d'une
+    indexation à l'autre, même si le découpage du reste de la page change. Les morceaux identiques
+    d'une même page sont distingués par un suffixe ("-1", "-2"...) selon leur ordre d'apparition.
+
+    :param chunks: Liste de morceaux de texte.
+    :return: La même liste, l'identifiant étant ajouté aux métadonnées ("id").
+    """
+    seen = {}
+    for chunk in chunks:
+        digest = hashlib.blake2b(chunk.page_content.encode("utf-8"), digest_size=8).hexdigest()
+        chunk_id = f"{chunk.metadata.get('source')}:{chunk.metadata.get('page')}:{digest}"
+        occurrence = seen.get(chunk_id, 0)
+        seen[chunk_id] = occurrence + 1
+        chunk.metadata["id"] = f"{chunk_id}-{occurrence}" if occurrence else chunk_id
+    return chunks
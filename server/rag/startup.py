@@ -0,0 +1,149 @@
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+# Commandes de gestion qui lancent un serveur (les autres ne déclenchent pas la synchronisation)
+SERVER_COMMANDS = {"runserver"}
+# Serveurs ASGI/WSGI connus, reconnus au nom du programme lancé
+SERVER_PROGRAMS = {"daphne", "uvicorn", "gunicorn", "hypercorn"}
+# Variable d'environnement qui active la synchronisation pour un autre serveur (mod_wsgi...) quand elle vaut "1"
+SERVER_PROCESS_ENV = "RAG_SERVER_PROCESS"
+
+# Heure de démarrage du processus : une synchronisation terminée après cette heure par un
+# autre processus n'a pas besoin d'être refaite
+_process_started_at = time.time()
+
+_state = {
+    "status": "pending",  # pending, running, done, failed, skipped
+    "started_at": None,
+    "finished_at": None,
+    "error": None,
+}
+_state_lock = threading.Lock()
+_thread = None
+
+
+def start_reconciliation():
+    """
+    Lance la synchronisation de la base avec le répertoire de données au démarrage,
+    selon le mode `STARTUP_INGESTION_MODE` :
+
+    - "background" : dans un thread, l'application répond immédiatement avec l'index existant ;
+    - "blocking" : avant de rendre la main (comportement historique) ;
+    - "off" : pas de synchronisation au démarrage.
+
+    Rien n'est fait en dehors des processus serveur (voir `is_server_process`) : commandes de
+    gestion (migrate...), processus de surveillance de l'autoreload, scripts, tests, notebooks...
+    """
+    global _thread
+    mode = settings.STARTUP_INGESTION_MODE
+    if mode == "off" or not is_server_process():
+        _set_state(status="skipped")
+        return
+    if mode == "blocking":
+        reconcile()
+        return
+
+    with _state_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=reconcile, name="startup-reconciliation", daemon=True)
+    _thread.start()
+
+
+def reconcile():
+    """
+    Synchronise la base de chaque collection avec son répertoire de données, sous un verrou
+    partagé entre les processus.
+
+    Le premier processus qui obtient le verrou fait la synchronisation ; les processus qui
+    attendaient le verrou constatent qu'elle a été faite après leur démarrage et ne la refont pas.
+    """
+    from .collection import get_collection, list_collections
+    from .populate_database import populate_database
+
+    _set_state(status="running", started_at=time.time())
+    try:
+        with open(settings.STARTUP_LOCK_PATH, "a+") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if _last_reconciled_at(lock_file) >= _process_started_at:
+                    print("✅ Base déjà synchronisée par un autre processus")
+                else:
+                    for name in list_collections():
+                        indexed_files = populate_database(collection=get_collection(name))
+                        print(f"✅ Synchronisation de la collection '{name}' terminée ({indexed_files} fichiers indexés)")
+                    # Dater la synchronisation pour les autres processus
+                    lock_file.seek(0)
+                    lock_file.truncate()
+                    lock_file.write(str(time.time()))
+                    lock_file.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        _set_state(status="done", finished_at=time.time())
+    except Exception as e:
+        print(f"🚫 Échec de la synchronisation de la base au démarrage : {e}")
+        _set_state(status="failed", error=str(e), finished_at=time.time())
+
+
+def get_readiness():
+    """
+    :return: L'état de la synchronisation de démarrage, avec la clé "ready" à True
+             lorsqu'elle est terminée (ou n'a pas lieu dans ce processus).
+    """
+    with _state_lock:
+        state = dict(_state)
+    state["ready"] = state["status"] in ("done", "skipped")
+    return state
+
+
+def is_server_process():
+    """
+    Détermine si le processus courant sert l'application : serveur ASGI/WSGI connu (`SERVER_PROGRAMS`),
+    `runserver`, ou processus marqué par la variable d'environnement `SERVER_PROCESS_ENV`.
+
+    :return: False pour tout autre processus (commandes de gestion, processus parent de l'autoreload,
+             scripts, tests ou notebooks appelant `django.setup()`...).
+    """
+    if os.environ.get(SERVER_PROCESS_ENV) == "1":
+        return True
+    program = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if program == "__main__.py":
+        # Lancé avec `python -m <serveur>` : le nom du programme est celui du paquet
+        program = os.path.basename(os.path.dirname(sys.argv[0]))
+    program = os.path.splitext(program)[0]
+    if program in SERVER_PROGRAMS:
+        return True
+    if program not in ("manage", "django-admin"):
+        return False
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in SERVER_COMMANDS:
+        return False
+    # Avec l'autoreload, seul le processus enfant (RUN_MAIN) sert les requêtes
+    return "--noreload" in sys.argv or os.environ.get("RUN_MAIN") == "true"
+
+
+def _last_reconciled_at(lock_file):
+    """
+    :return: Date de la dernière synchronisation enregistrée dans le fichier de verrou (0 si aucune).
+    """
+    lock_file.seek(0)
+    try:
+        return float(lock_file.read().strip() or 0)
+    except ValueError:
+        return 0
+
+
+def _set_state(**values):
+    with _state_lock:
+        _state.update(values)
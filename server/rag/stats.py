@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+from .collection import Collection, get_collection
+from .manifest import get_manifest
+
+# Nom du fichier de statistiques, stocké à côté de la base Chroma
+STATS_FILENAME = "stats.json"
+
+_lock = threading.Lock()
+# Statistiques en mémoire, par chemin : couples (statistiques, date de modification du fichier)
+_cached_stats = {}
+
+
+def get_stats_path(collection: Collection | None = None):
+    """
+    :param collection: Collection (collection par défaut si absente).
+    :return: Chemin du fichier de statistiques de la collection.
+    """
+    collection = collection or get_collection()
+    return os.path.join(collection.index_path, STATS_FILENAME)
+
+
+def get_collection_stats(collection: Collection | None = None, bootstrap: bool = True):
+    """
+    Retourne les statistiques de la collection en temps constant : nombre de morceaux,
+    nombre de fichiers et date de dernière modification.
+
+    Les statistiques sont tenues à jour à chaque ajout et suppression. Elles sont relues
+    depuis le disque uniquement si un autre processus les a modifiées.
+
+    :param collection: Collection (collection par défaut si absente).
+    :param bootstrap: Initialiser les statistiques depuis la base si le fichier n'existe pas encore
+                      (ce qui ouvre la base vectorielle de la collection).
+    :return: Dictionnaire avec les clés "chunks", "files" et "last_modified", ou None si le fichier
+             n'existe pas et que `bootstrap` est False.
+    """
+    collection = collection or get_collection()
+    path = get_stats_path(collection)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return _bootstrap_stats(collection) if bootstrap else None
+
+    cached = _cached_stats.get(path)
+    if cached is None or mtime != cached[1]:
+        with _lock:
+            cached = _cached_stats[path] = (_read_stats(path), mtime)
+    return dict(cached[0])
+
+
+def update_collection_stats(chunks: int = 0, files: int = 0, collection: Collection | None = None):
+    """
+    Met à jour les statistiques après un ajout ou une suppression.
+
+    :param chunks: Variation du nombre de morceaux.
+    :param files: Variation du nombre de fichiers.
+    :param collection: Collection (collection par défaut si absente).
+    """
+    if not chunks and not files:
+        return
+    collection = collection or get_collection()
+    # Créer le fichier s'il n'existe pas encore, avant d'appliquer la variation
+    get_collection_stats(collection)
+    path = get_stats_path(collection)
+    # Lecture, modification et écriture sous le même verrou : aucune mise à jour n'est perdue,
+    # y compris celles d'un autre processus (`manage.py ingest`)
+    with _stats_lock(path):
+        stats = _read_stats(path)
+        stats["chunks"] = max(0, stats["chunks"] + chunks)
+        stats["files"] = max(0, stats["files"] + files)
+        stats["last_modified"] = time.time()
+        _write_stats(path, stats)
+
+
+def set_collection_stats(chunks: int, files: int, collection: Collection | None = None):
+    """
+    Remplace les statistiques par des valeurs exactes (par exemple à la fin d'une synchronisation).
+
+    :param chunks: Nombre de morceaux dans la base.
+    :param files: Nombre de fichiers indexés.
+    :param collection: Collection (collection par défaut si absente).
+    """
+    path = get_stats_path(collection)
+    with _stats_lock(path):
+        stats = _read_stats(path) if os.path.exists(path) else {"last_modified": None}
+        if stats.get("chunks") == chunks and stats.get("files") == files:
+            return
+        stats.update(chunks=chunks, files=files, last_modified=time.time())
+        _write_stats(path, stats)
+
+
+def recount_collection_stats(collection: Collection):
+    """
+    Recale les statistiques sur le contenu réel de la base et du manifeste, après une
+    indexation ou une suppression. Doit être appelée dans un bloc `with collection.use():`.
+
+    :param collection: Collection.
+    """
+    set_collection_stats(
+        chunks=collection.get_vector_store().count(),
+        files=len(get_manifest(collection).entries),
+        collection=collection,
+    )
+
+
+def _bootstrap_stats(collection: Collection):
+    """
+    Initialise les statistiques à partir de la base et du manifeste, lorsque le fichier
+    de statistiques n'existe pas encore (base créée par une version précédente, ou vidée).
+    Une collection sans index est vide : rien n'est créé sur le disque.
+
+    :param collection: Collection.
+    :return: Les statistiques initialisées.
+    """
+    if not collection.exists():
+        return {"chunks": 0, "files": 0, "last_modified": None}
+    with collection.use():
+        stats = {
+            "chunks": collection.get_vector_store().count(),
+            "files": len(get_manifest(collection).entries),
+            "last_modified": None,
+        }
+        path = get_stats_path(collection)
+        with _stats_lock(path):
+            # Un autre processus a pu créer le fichier entre-temps : ses valeurs sont conservées
+            if os.path.exists(path):
+                return _read_stats(path)
+            _write_stats(path, stats)
+    return dict(stats)
+
+
+@contextmanager
+def _stats_lock(path: str):
+    """
+    Verrou exclusif des mises à jour d'un fichier de statistiques, entre les threads du processus
+    et entre processus (verrou sur un fichier voisin).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock, open(f"{path}.lock", "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _read_stats(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_stats(path: str, stats: dict):
+    """
+    Enregistre les statistiques de manière atomique et met à jour la copie en mémoire.
+    Doit être appelée avec le verrou acquis.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, path)
+    _cached_stats[path] = (dict(stats), os.stat(path).st_mtime_ns)
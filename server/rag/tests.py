@@ -0,0 +1,50 @@
+import threading
+
+from django.test import SimpleTestCase
+from langchain_core.embeddings import Embeddings
+
+from .query_embeddings import QueryEmbedder
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Fonction d'embedding factice qui compte les appels au modèle.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.calls.append(list(texts))
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class QueryEmbedderTests(SimpleTestCase):
+    def test_batch_makes_a_single_backend_call(self):
+        embeddings = CountingEmbeddings()
+        # Fenêtre large : toutes les questions sont soumises avant l'intégration du lot
+        embedder = QueryEmbedder(embeddings, window=0.5, max_batch=8, cache_size=16)
+        questions = [f"question {i}" for i in range(8)]
+
+        futures = [embedder.submit(question) for question in questions]
+        vectors = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(len(embeddings.calls), 1)
+        self.assertEqual(sorted(embeddings.calls[0]), sorted(questions))
+        self.assertEqual(vectors, [embeddings.embed_query(question) for question in questions])
+
+    def test_cancelled_request_does_not_stop_the_embedder(self):
+        embeddings = CountingEmbeddings()
+        embedder = QueryEmbedder(embeddings, window=0.2, max_batch=8, cache_size=16)
+
+        cancelled = embedder.submit("annulée")
+        self.assertTrue(cancelled.cancel())
+        kept = embedder.submit("conservée")
+
+        self.assertEqual(kept.result(timeout=5), embeddings.embed_query("conservée"))
+        self.assertEqual(embeddings.calls[0], ["conservée"])
@@ -0,0 +1,224 @@
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils.text import slugify
+
+# Index empreinte -> nom des fichiers mis en place, et son verrou, dans le répertoire de données
+# (fichiers cachés, ignorés par l'indexation)
+UPLOAD_INDEX_FILENAME = ".uploads.json"
+UPLOAD_LOCK_FILENAME = ".uploads.lock"
+
+_upload_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class HashedUpload:
+    """
+    Fichier téléversé, écrit dans un fichier temporaire, avec l'empreinte de son contenu.
+    """
+
+    name: str
+    temp_path: str
+    size: int
+    content_hash: str
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Gestionnaire de téléversement qui écrit chaque fichier reçu dans un fichier temporaire de
+    `UPLOAD_TEMP_PATH` en calculant l'empreinte SHA-256 de son contenu au fil de la réception :
+    le fichier n'est ni gardé en mémoire, ni relu pour calculer son empreinte.
+
+    Un fichier plus gros que `UPLOAD_MAX_FILE_SIZE` interrompt la réception : `too_large` contient
+    alors son nom. Les fichiers temporaires restants sont supprimés par `cleanup()`.
+    """
+
+    def __init__(self, request=None, max_size: int | None = None, directory: str | None = None):
+        super().__init__(request)
+        self.max_size = max_size or settings.UPLOAD_MAX_FILE_SIZE
+        self.directory = directory or settings.UPLOAD_TEMP_PATH
+        self.too_large = None
+        self.uploads = []
+        self._temp_path = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=self.directory, suffix=".upload")
+        # Le parseur de Django ferme `self.file` lorsque la réception est interrompue
+        self.file = os.fdopen(fd, "wb")
+        self._digest = hashlib.sha256()
+        self._size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self._size += len(raw_data)
+        if self._size > self.max_size:
+            self.too_large = self.file_name
+            self._discard_current()
+            # Le reste de la requête est lu sans être enregistré, pour pouvoir répondre au client
+            raise StopUpload(connection_reset=False)
+        self.file.write(raw_data)
+        self._digest.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.close()
+        upload = HashedUpload(self.file_name, self._temp_path, file_size, self._digest.hexdigest())
+        self.uploads.append(upload)
+        self._temp_path = None
+        return upload
+
+    def upload_interrupted(self):
+        self._discard_current()
+
+    def cleanup(self):
+        """
+        Supprime les fichiers temporaires qui n'ont pas été mis en place (voir `save_upload`).
+        """
+        self._discard_current()
+        for upload in self.uploads:
+            discard_upload(upload)
+
+    def _discard_current(self):
+        if self._temp_path is not None:
+            self.file.close()
+            _remove_if_exists(self._temp_path)
+            self._temp_path = None
+
+
+def save_upload(upload: HashedUpload, directory: str):
+    """
+    Met en place un fichier téléversé dans un répertoire de données, sous un nom sûr et unique :
+    un fichier existant n'est jamais écrasé, le nom reçoit un suffixe ("-1", "-2"...) si besoin.
+
+    Le fichier n'apparaît dans le répertoire qu'une fois complet (lien vers le fichier temporaire
+    puis suppression de celui-ci) : l'indexation ne voit jamais un PDF partiellement écrit.
+
+    L'empreinte du contenu est enregistrée dans l'index du répertoire sous le même verrou que la
+    mise en place : un contenu déjà présent (même s'il n'est pas encore indexé, ou s'il vient d'être
+    reçu par une requête simultanée) n'est pas mis en place une seconde fois.
+
+    :param upload: Fichier téléversé.
+    :param directory: Répertoire de données de destination.
+    :return: Couple (chemin du fichier, True s'il vient d'être mis en place). Si un fichier de même
+             contenu existe déjà, son chemin est retourné avec False et le fichier temporaire est supprimé.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _directory_lock(directory):
+        index = _read_upload_index(directory)
+        existing = index.get(upload.content_hash)
+        if existing is not None and os.path.exists(os.path.join(directory, existing)):
+            discard_upload(upload)
+            return os.path.join(directory, existing), False
+
+        file_path = _place_upload(upload, directory)
+        index[upload.content_hash] = os.path.basename(file_path)
+        _write_upload_index(directory, index)
+    return file_path, True
+
+
+def _place_upload(upload: HashedUpload, directory: str):
+    """
+    Voir `save_upload`. Doit être appelée avec le verrou du répertoire acquis.
+
+    :return: Chemin du fichier mis en place.
+    """
+    temp_path = upload.temp_path
+    if os.stat(temp_path).st_dev != os.stat(directory).st_dev:
+        # Autre système de fichiers : copier d'abord à côté de la destination (fichier caché, ignoré par l'indexation)
+        fd, local_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".upload")
+        os.close(fd)
+        shutil.copyfile(temp_path, local_path)
+        os.remove(temp_path)
+        temp_path = local_path
+
+    base, extension = os.path.splitext(upload.name)
+    base = slugify(base) or "document"
+    for n in itertools.count():
+        file_path = os.path.join(directory, f"{base}-{n}{extension}" if n else f"{base}{extension}")
+        try:
+            _place_file(temp_path, file_path)
+        except FileExistsError:
+            continue
+        return file_path
+
+
+def discard_upload(upload: HashedUpload):
+    """
+    Supprime le fichier temporaire d'un fichier téléversé qui n'est pas mis en place (doublon...).
+    """
+    _remove_if_exists(upload.temp_path)
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    """
+    Verrou exclusif de la mise en place des fichiers dans un répertoire de données,
+    entre les threads du processus et entre processus.
+    """
+    with _upload_lock, open(os.path.join(directory, UPLOAD_LOCK_FILENAME), "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _read_upload_index(directory: str):
+    try:
+        with open(os.path.join(directory, UPLOAD_INDEX_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_upload_index(directory: str, index: dict):
+    """
+    Enregistre l'index des empreintes de manière atomique, sans les fichiers supprimés depuis.
+    """
+    index = {
+        content_hash: name for content_hash, name in index.items()
+        if os.path.exists(os.path.join(directory, name))
+    }
+    path = os.path.join(directory, UPLOAD_INDEX_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _remove_if_exists(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _place_file(temp_path: str, file_path: str):
+    """
+    Déplace un fichier vers une destination qui ne doit pas exister, de manière atomique.
+
+    :raises FileExistsError: Si la destination existe déjà.
+    """
+    try:
+        # La création du lien échoue si la destination existe, sans fenêtre entre vérification et écriture
+        os.link(temp_path, file_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # Système de fichiers sans liens physiques : renommage après vérification
+        if os.path.exists(file_path):
+            raise FileExistsError(file_path)
+        os.replace(temp_path, file_path)
+        return
+    os.remove(temp_path)
@@ -8,11 +8,16 @@ urlpatterns = [
     path("", RedirectView.as_view(url="chat/", permanent=True)), # Redirige vers la page de chat
     path("chat/", views.chat, name="chat"), # Page de chat
     path("add_file/", views.add_file, name="add_file"), # Ajouter un fichier
+    path("ingestion_jobs/<str:job_id>/", views.ingestion_job, name="ingestion_job"), # Avancement d'une indexation
     path("list_documents/", views.list_documents, name="list_documents"), # Liste des documents / charger les documents qui ne le sont pas encore
     path("delete_document/", views.delete_document, name="delete_document"), # Supprimer un document
+    path("rebuild/", views.rebuild, name="rebuild"), # Reconstruire l'index dans une nouvelle version
+    path("health/", views.health, name="health"), # État de la base de connaissances
+    path("ready/", views.ready, name="ready"), # Synchronisation de démarrage terminée ou non
+    path("metrics/", views.metrics, name="metrics"), # Métriques au format Prometheus
     path(
-        "events/",
+        "events/<str:channel>/",
         include(urls),
-        {"channels": ["chat"]},
-    ), # URL pour les événements, chat en temps réel
+        {"format-channels": ["chat-{channel}"]},
+    ), # URL pour les événements, chat en temps réel (un canal par session)
 ]
@@ -1,135 +1,330 @@
+import asyncio
 import os
 import re
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.utils.text import slugify
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
-from django_eventstream import send_event
-from langchain_chroma import Chroma
 
-from .get_embedding_function import get_embedding_function
-from .populate_database import add_to_chroma, load_documents, split_documents, populate_database
-from .query_data import query_rag
+from .answer_cache import get_answer_cache
+from .collection import get_collection, list_collections
+from .filters import SearchFilters
+from .events import (
+    SESSION_CHANNEL_KEY,
+    CoalescingPublisher,
+    Stopwatch,
+    get_channel_name,
+    new_channel_token,
+)
+from .get_embedding_function import get_embedding_cache
+from .manifest import get_manifest
+from .metrics import CONTENT_TYPE, REGISTRY
+from .jobs import get_ingestion_queue
+from .populate_database import delete_file_chunks
+from .query_data import aquery_rag
+from .query_embeddings import get_query_embedder
+from .startup import get_readiness
+from .stats import get_collection_stats
+from .uploads import HashingUploadHandler, discard_upload, save_upload
+
+# Sémaphore limitant le nombre de générations simultanées, créé pour la boucle d'événements courante
+_generation_semaphore = None
+_generation_semaphore_loop = None
 
 @csrf_exempt
-def chat(request):
+async def chat(request):
     """
     Vue permettant de gérer le système de chat basé sur un modèle RAG (Retrieval-Augmented Generation).
     Envoie les messages en temps réel via des événements serveur (Server-Sent Events).
+
+    La vue est asynchrone : l'embedding de la requête, la recherche et la génération ne bloquent
+    pas de worker. Le nombre de générations simultanées est limité, et si le client se déconnecte,
+    la génération est interrompue côté serveur de modèles.
     """
+    try:
+        collection = get_request_collection(request)  # Seuls les documents de cette collection sont cherchés
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     if request.method == "POST":
-        query_text = request.POST.get("query")  # Récupère la requête utilisateur
-        response_generator, sources = query_rag(query_text)  # Interroge le modèle RAG
-        formatted_sources_text = clean_ids(sources)  # Nettoie les identifiants des sources
+        query_text = request.POST.get("query", "").strip()  # Récupère la requête utilisateur
+        if not query_text:
+            return JsonResponse({"error": "Question manquante"}, status=400)
+        try:
+            # Filtres optionnels : fichiers, pages et date de téléversement des documents cherchés
+            filters = SearchFilters.from_query(request.POST)
+        except ValueError as e:
+            return JsonResponse({"error": f"Filtre invalide : {e}"}, status=400)
+
+        # Canal d'événements propre à la session de l'utilisateur
+        channel_token = await get_session_channel(request)
+        publisher = CoalescingPublisher(get_channel_name(channel_token))
+        stopwatch = Stopwatch()
+
+        # Attend une place libre si trop de générations sont en cours (contre-pression)
+        async with get_generation_semaphore():
+            response_generator, sources = await aquery_rag(query_text, collection, filters)  # Interroge le modèle RAG
+            formatted_sources_text = clean_ids(sources)  # Nettoie les identifiants des sources
+            stopwatch.mark("retrieval_ms")
+
+            # Envoie les réponses, regroupées en morceaux, via des événements serveur
+            try:
+                async for chunk in response_generator:
+                    stopwatch.mark("first_token_ms")
+                    await publisher.write(chunk)
+            finally:
+                # En cas de déconnexion (annulation de la vue), fermer le flux interrompt la génération
+                await response_generator.aclose()
 
-        # Définir un canal d'événements pour la session
-        channel_name = f"chat"
+        # Événement final : sources et durées des étapes
+        stopwatch.mark("total_ms")
+        await publisher.close(sources=formatted_sources_text, timing=stopwatch.marks)
 
-        # Envoie les réponses en morceaux via des événements serveur
-        for chunk in response_generator:
-            send_event(channel_name, "message", {"text": chunk})
+        # Retourne les sources et le canal utilisé en réponse pour terminer
+        return JsonResponse({"sources": formatted_sources_text, "channel": channel_token})
 
-        # Retourne les sources en réponse pour terminer
-        return JsonResponse({"sources": formatted_sources_text})
-    return render(request, "rag/chat.html")  # Charge la page HTML pour le chat
+    channel_token = await get_session_channel(request)
+    return await sync_to_async(render)(
+        request, "rag/chat.html", {"chat_channel": channel_token, "collection": collection.name}
+    )  # Charge la page HTML pour le chat
+
+def get_request_collection(request):
+    """
+    Retourne la collection demandée par le paramètre "collection" de la requête (POST ou GET),
+    ou la collection par défaut.
+
+    :raises ValueError: Si le nom de collection est invalide.
+    """
+    return get_collection(request.POST.get("collection") or request.GET.get("collection"))
+
+async def get_session_channel(request):
+    """
+    Retourne l'identifiant du canal d'événements de la session, en le créant si besoin.
+    Chaque utilisateur ne reçoit ainsi que les réponses à ses propres questions.
+    """
+    channel_token = await request.session.aget(SESSION_CHANNEL_KEY)
+    if channel_token is None:
+        channel_token = new_channel_token()
+        await request.session.aset(SESSION_CHANNEL_KEY, channel_token)
+    return channel_token
+
+def get_generation_semaphore():
+    """
+    Retourne le sémaphore limitant le nombre de générations simultanées.
+    Un asyncio.Semaphore est lié à une boucle d'événements : il est recréé si la boucle change.
+    """
+    global _generation_semaphore, _generation_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _generation_semaphore is None or _generation_semaphore_loop is not loop:
+        _generation_semaphore = asyncio.Semaphore(settings.CHAT_MAX_CONCURRENT_GENERATIONS)
+        _generation_semaphore_loop = loop
+    return _generation_semaphore
 
 @csrf_exempt
 def add_file(request):
     """
     Vue permettant d'ajouter des fichiers au système, de les traiter et de les insérer dans la base de données.
+
+    Les fichiers sont écrits au fil de la réception dans des fichiers temporaires, avec l'empreinte de leur
+    contenu (voir `HashingUploadHandler`). Un fichier dont le contenu est déjà indexé n'est ni enregistré,
+    ni réindexé ; les autres sont mis en place sous un nom unique, sans écraser de fichier existant.
+    """
+    # Doit être installé avant la première lecture de request.POST ou request.FILES
+    upload_handler = HashingUploadHandler(request)
+    request.upload_handlers = [upload_handler]
+    try:
+        if request.method != "POST" or not (request.FILES or upload_handler.too_large):
+            return JsonResponse({"error": "Aucun fichier reçu"}, status=400)
+        if upload_handler.too_large:
+            return JsonResponse({
+                "error": f"Fichier trop volumineux : {upload_handler.too_large} "
+                         f"(maximum {settings.UPLOAD_MAX_FILE_SIZE} octets)",
+            }, status=413)
+        try:
+            collection = get_request_collection(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        manifest = get_manifest(collection)
+        file_paths = []
+        files = []
+        for upload in request.FILES.getlist("files"):  # Récupère les fichiers téléchargés
+            # Contenu déjà indexé, sous ce nom ou un autre
+            existing = [path for path in manifest.find_by_hash(upload.content_hash) if os.path.exists(path)]
+            if existing:
+                discard_upload(upload)
+                files.append({"name": upload.name, "status": "duplicate", "duplicate_of": os.path.basename(existing[0])})
+                continue
+
+            # Met le fichier en place dans le dossier de données de la collection, sauf si le même
+            # contenu y a déjà été mis en place (en attente d'indexation, requête simultanée...)
+            file_path, created = save_upload(upload, collection.data_path)
+            if not created:
+                files.append({"name": upload.name, "status": "duplicate", "duplicate_of": os.path.basename(file_path)})
+                continue
+            file_paths.append(file_path)
+            files.append({"name": upload.name, "status": "queued", "stored_as": os.path.basename(file_path)})
+    finally:
+        upload_handler.cleanup()
+
+    if not file_paths:
+        return JsonResponse({"status": "Files already indexed", "files": files, "job_id": None})
+
+    # Indexe les fichiers en arrière-plan et répond immédiatement avec l'identifiant de la tâche
+    job = get_ingestion_queue().enqueue(file_paths, collection)
+    return JsonResponse({"status": "Files queued for indexing", "files": files, "job_id": job.id}, status=202)
+
+@require_GET
+def ingestion_job(request, job_id):
+    """
+    Vue retournant l'état d'une tâche d'indexation : pages analysées, morceaux intégrés
+    et temps restant estimé.
     """
-    if request.method == "POST" and request.FILES:
-        uploaded_files = request.FILES.getlist("files")  # Récupère les fichiers téléchargés
-        for uploaded_file in uploaded_files:
-            # Crée un nom de fichier sécurisé
-            filename = slugify(os.path.splitext(uploaded_file.name)[0])
-            extension = os.path.splitext(uploaded_file.name)[1]
-            sanitized_filename = f"{filename}{extension}"
-
-            # Sauvegarde le fichier dans le dossier spécifié
-            os.makedirs(settings.DATA_PATH, exist_ok=True)
-            file_path = os.path.join(settings.DATA_PATH, sanitized_filename)
-            with open(file_path, "wb") as f:
-                for chunk in uploaded_file.chunks():
-                    f.write(chunk)
-
-        # Charge les documents, les segmente en morceaux et les ajoute à la base Chroma
-        documents = load_documents()
-        if documents:
-            chunks = split_documents(documents)
-            add_to_chroma(chunks)
-            return JsonResponse({"status": "Files added successfully"})
-        else:
-            return JsonResponse({"status": "No documents to add"})
+    job = get_ingestion_queue().get(job_id)
+    if job is None:
+        return JsonResponse({"error": "Tâche inconnue"}, status=404)
+    return JsonResponse(job.to_dict())
 
 @csrf_exempt
 @require_GET
 def list_documents(request):
     """
-    Vue permettant de lister tous les documents présents dans la base de données et de les charger s'ils ne le sont pas.
+    Vue permettant de lister tous les documents présents dans la base de données d'une collection
+    et de les charger s'ils ne le sont pas.
     """
-    populate_database() # Charger les documents pour être sûr de tous les avoir
-    
-    db = Chroma(
-        persist_directory=settings.CHROMA_PATH,
-        embedding_function=get_embedding_function(),
-    )
+    try:
+        collection = get_request_collection(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # Charger en arrière-plan les documents qui ne le sont pas encore, sauf si une synchronisation
+    # est déjà en attente ou en cours : son identifiant est alors retourné
+    job = get_ingestion_queue().enqueue(collection=collection, reuse_running=True)
 
-    # Récupère les documents enregistrés et nettoie leurs identifiants
-    documents = db.get(include=["documents"])["ids"]
-    cleaned_id = clean_ids(documents)
-    return JsonResponse({"documents": list(cleaned_id)})
+    # Liste les fichiers indexés et leur nombre de morceaux à partir du manifeste
+    documents = get_manifest(collection).documents()
+    return JsonResponse({
+        "collection": collection.name,
+        "documents": documents,
+        "stats": get_collection_stats(collection),
+        "job_id": job.id,
+    })
+
+@csrf_exempt
+@require_POST
+def rebuild(request):
+    """
+    Vue lançant en arrière-plan la reconstruction complète de l'index d'une collection : les
+    questions continuent d'utiliser l'index actuel jusqu'à la mise en service du nouveau.
+    """
+    try:
+        collection = get_request_collection(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    job = get_ingestion_queue().enqueue(collection=collection, rebuild=True)
+    return JsonResponse({"status": "Rebuild queued", "job_id": job.id}, status=202)
+
+@require_GET
+def health(request):
+    """
+    Vue retournant l'état de la base de connaissances (nombre de morceaux, de fichiers
+    et date de dernière modification, pour la collection par défaut et pour chaque collection),
+    calculé en temps constant, ainsi que les statistiques des caches.
+
+    Seuls les fichiers de statistiques existants sont lus (null sinon) : la vue n'ouvre jamais
+    la base d'une collection.
+    """
+    answer_cache = get_answer_cache()
+    embedding_cache = get_embedding_cache()
+    return JsonResponse({
+        "status": "ok",
+        "stats": get_collection_stats(bootstrap=False),
+        "collections": {
+            name: get_collection_stats(get_collection(name), bootstrap=False) for name in list_collections()
+        },
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "query_embeddings": get_query_embedder().stats(),
+    })
+
+@require_GET
+def ready(request):
+    """
+    Vue indiquant si la synchronisation de la base au démarrage est terminée
+    (code 503 tant qu'elle est en cours ou si elle a échoué).
+    """
+    readiness = get_readiness()
+    return JsonResponse(readiness, status=200 if readiness["ready"] else 503)
+
+@require_GET
+def metrics(request):
+    """
+    Vue exposant les métriques du processus au format texte de Prometheus : durées des étapes
+    de l'indexation et des requêtes, compteurs, taille de la base et efficacité des caches.
+    """
+    stats = get_collection_stats()
+    gauges = [
+        ("rag_collection_chunks", "gauge", "Morceaux dans la base.", stats["chunks"]),
+        ("rag_collection_files", "gauge", "Fichiers indexés.", stats["files"]),
+        ("rag_ready", "gauge", "Synchronisation de démarrage terminée (1) ou non (0).", get_readiness()["ready"]),
+    ]
+    caches = {
+        "answer_cache": get_answer_cache(),
+        "embedding_cache": get_embedding_cache(),
+        "query_embedding_cache": get_query_embedder(),
+    }
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        cache_stats = cache.stats()
+        gauges += [
+            (f"rag_{name}_hits_total", "counter", "Succès du cache.", cache_stats["hits"]),
+            (f"rag_{name}_misses_total", "counter", "Échecs du cache.", cache_stats["misses"]),
+            (f"rag_{name}_entries", "gauge", "Entrées du cache.", cache_stats["entries"]),
+        ]
+    return HttpResponse(REGISTRY.render(gauges), content_type=CONTENT_TYPE)
 
 @csrf_exempt
 @require_POST
 def delete_document(request):
     """
-    Vue permettant de supprimer un document spécifique en fonction de son identifiant.
+    Vue permettant de supprimer un document spécifique d'une collection en fonction de son identifiant.
     """
     doc_id = request.POST.get("doc_id")  # Récupère l'ID du document à supprimer
     if not doc_id:
         return JsonResponse({"error": "ID du document manquant"}, status=400)
+    try:
+        collection = get_request_collection(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    delete_file_references(doc_id)  # Supprime les références associées dans la base
-    delete_file(doc_id)  # Supprime le fichier du système de fichiers
+    delete_file(doc_id, collection)  # Supprime le fichier du système de fichiers
+    delete_file_references(doc_id, collection)  # Supprime les références associées dans la base
     return JsonResponse({"status": "Document supprimé avec succès"})
 
-def delete_file_references(file_name: str):
+def delete_file_references(file_name: str, collection=None):
     """
     Supprime toutes les références liées à un fichier dans la base de données Chroma.
-    :param file_name: Nom du fichier à rechercher dans les métadonnées (e.g., "mon_fichier.pdf").
-    """
-    # Charger la base de données
-    db = Chroma(
-        persist_directory=settings.CHROMA_PATH,
-        embedding_function=get_embedding_function(),
-    )
-    existing_items = db.get(include=["metadatas"])  # Récupère les métadonnées existantes
-    ids_to_delete = []
-
-    # Recherche des références associées au fichier
-    for doc_id, metadata in zip(existing_items["ids"], existing_items["metadatas"]):
-        source = metadata.get("source", "")
-        if file_name in source:
-            ids_to_delete.append(doc_id)
-
-    # Supprime les documents identifiés
-    if ids_to_delete:
-        print(f"🔍 {len(ids_to_delete)} documents trouvés pour '{file_name}'. Suppression...")
-        db.delete(ids=ids_to_delete)
-        print("✅ Documents supprimés avec succès.")
+    :param file_name: Nom exact du fichier (e.g., "mon_fichier.pdf").
+    :param collection: Collection du fichier (collection par défaut si absente).
+    """
+    deleted_chunks = delete_file_chunks(file_name, collection)
+    if deleted_chunks:
+        print(f"✅ {deleted_chunks} documents supprimés pour '{file_name}'.")
     else:
         print(f"🚫 Aucune référence trouvée pour '{file_name}'.")
 
-def delete_file(file_name: str):
+def delete_file(file_name: str, collection=None):
     """
     Supprime un fichier spécifique du système de fichiers.
     :param file_name: Nom du fichier à supprimer.
+    :param collection: Collection du fichier (collection par défaut si absente).
     """
-    file_path = os.path.join(settings.DATA_PATH, file_name)
+    file_path = os.path.join((collection or get_collection()).data_path, file_name)
     if os.path.exists(file_path):
         os.remove(file_path)
         print(f"✅ Fichier '{file_name}' supprimé avec succès.")
@@ -135,12 +135,134 @@ LANGUAGE_MODEL_NAME = "llama3.2"
 # Modèle utilisé pour les embeddings
 EMBEDDING_MODEL_NAME = "nomic-embed-text"
 
+# Adresse du serveur Ollama (None pour utiliser la variable d'environnement OLLAMA_HOST ou l'adresse par défaut)
+OLLAMA_BASE_URL = None
+
+# Nombre maximal de connexions HTTP ouvertes vers Ollama par client (connexions réutilisées entre les requêtes)
+OLLAMA_MAX_CONNECTIONS = 10
+
+# Base vectorielle : "chroma" ou "numpy" (matrice NumPy projetée en mémoire, plus légère pour
+# les petits corpus). Les deux sont stockées dans le dossier CHROMA_PATH.
+VECTOR_STORE_BACKEND = "chroma"
+
+# Base "numpy" : type de stockage des vecteurs ("float32", "float16" ou "int8"), nombre de vecteurs
+# à partir duquel un index IVF limite la recherche aux partitions les plus proches, et nombre de
+# partitions parcourues par recherche
+VECTOR_STORE_DTYPE = "float32"
+VECTOR_STORE_IVF_MIN_ROWS = 50_000
+VECTOR_STORE_IVF_PROBES = 8
+
 # Chemin vers la base de données Chroma
 CHROMA_PATH = str(BASE_DIR / "chroma_db")
 
 # Chemin vers les documents à ajouter à la base de données
 DATA_PATH = os.path.join(BASE_DIR, "data")
 
+# Collections de documents nommées (par exemple une par équipe) : la collection par défaut utilise
+# CHROMA_PATH et DATA_PATH, les autres sont rangées dans COLLECTIONS_PATH/<nom>/ (data/ et chroma_db/)
+DEFAULT_COLLECTION = "default"
+COLLECTIONS_PATH = os.path.join(BASE_DIR, "collections")
+
+# Les bases d'une collection inutilisée depuis COLLECTION_IDLE_TIMEOUT secondes sont refermées,
+# et au plus COLLECTION_MAX_OPEN collections restent ouvertes à la fois
+COLLECTION_IDLE_TIMEOUT = 600
+COLLECTION_MAX_OPEN = 8
+
+# Fichiers téléversés : taille maximale d'un fichier (en octets, au-delà la requête est refusée
+# avec le code 413) et dossier où ils sont écrits pendant la réception, avant d'être mis en place
+UPLOAD_MAX_FILE_SIZE = 50 * 1024 * 1024
+UPLOAD_TEMP_PATH = os.path.join(BASE_DIR, ".uploads")
+
+# Synchronisation de la base au démarrage : "background" (en arrière-plan, l'application répond
+# immédiatement avec l'index existant), "blocking" (avant d'accepter les requêtes) ou "off"
+STARTUP_INGESTION_MODE = "background"
+
+# Fichier de verrou partagé par les processus, pour ne synchroniser la base qu'une fois au démarrage
+STARTUP_LOCK_PATH = str(BASE_DIR / ".startup_ingestion.lock")
+
+# Cache persistant des embeddings (None pour le désactiver), conservé lors des réinitialisations de la base
+EMBEDDING_CACHE_PATH = str(BASE_DIR / "embedding_cache" / "embeddings.sqlite3")
+
+# Nombre maximal d'embeddings conservés dans le cache (les moins récemment utilisés sont évincés)
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+
+# Nombre de tâches d'indexation exécutées en parallèle en arrière-plan
+INGESTION_WORKERS = 2
+
+# Nombre de processus utilisés pour analyser les fichiers PDF en parallèle
+PDF_PARSER_WORKERS = os.cpu_count() or 1
+
+# Découpage des documents en morceaux, par extension de fichier (".pdf"...) ou "default" pour les autres :
+# taille et chevauchement des morceaux, mesurés en caractères ("characters") ou en tokens ("tokens")
+TEXT_SPLITTERS = {
+    "default": {"chunk_size": 800, "chunk_overlap": 80, "length_unit": "characters"},
+}
+
+# Nombre minimal de pages d'un fichier pour répartir son découpage sur les processus d'analyse,
+# et nombre de pages envoyées à la fois à un processus
+SPLIT_PARALLEL_MIN_PAGES = 64
+SPLIT_PAGES_PER_TASK = 16
+
+# Nombre de morceaux envoyés au modèle d'embedding par requête
+EMBEDDING_BATCH_SIZE = 64
+
+# Nombre maximal de lots en cours d'intégration en parallèle
+EMBEDDING_MAX_IN_FLIGHT = 4
+
+# Nombre de nouvelles tentatives pour un lot en échec, et délai initial (en secondes, doublé à chaque tentative)
+EMBEDDING_MAX_RETRIES = 3
+EMBEDDING_RETRY_BACKOFF = 1.0
+
+# Regroupement des embeddings de questions : les questions reçues pendant QUERY_EMBEDDING_BATCH_WINDOW_MS
+# millisecondes (au plus QUERY_EMBEDDING_MAX_BATCH) sont intégrées en un seul appel au modèle
+QUERY_EMBEDDING_BATCH_WINDOW_MS = 5
+QUERY_EMBEDDING_MAX_BATCH = 32
+
+# Nombre d'embeddings de questions récentes conservés en mémoire
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Recherche des morceaux : "vector" (similarité des embeddings), "lexical" (BM25) ou "hybrid"
+# (fusion des deux classements par rang réciproque)
+RETRIEVAL_MODE = "hybrid"
+
+# Nombre de candidats proposés par chaque recherche avant la fusion en mode hybride
+RETRIEVAL_CANDIDATES = 20
+
+# Reclassement optionnel des morceaux trouvés avant la construction du prompt : "off" (par défaut),
+# "lexical" (BM25 sur les candidats, fusionné avec l'ordre de la recherche ; redondant avec
+# RETRIEVAL_MODE = "hybrid", qui tient déjà compte de BM25) ou "cross-encoder" (modèle RERANK_MODEL,
+# nécessite le paquet sentence-transformers)
+RERANK_MODE = "off"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Nombre de threads du pool de reclassement (calcul sur le processeur, indépendant du nombre de générations)
+RERANK_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Nombre de candidats recherchés avant le reclassement
+RERANK_CANDIDATES = 20
+
+# Temps maximal (en millisecondes) consacré au reclassement : au-delà, l'ordre de la recherche est conservé
+RERANK_TIME_BUDGET_MS = 200
+
+# Nombre maximal de tokens du contexte envoyé au modèle de langage, et encodage tiktoken
+# utilisé pour les compter (estimation à partir du nombre de caractères si tiktoken n'est pas installé)
+CONTEXT_TOKEN_BUDGET = 2000
+CONTEXT_TOKEN_ENCODING = "cl100k_base"
+
+# Nombre maximal de réponses générées simultanément par processus (les requêtes suivantes attendent leur tour)
+CHAT_MAX_CONCURRENT_GENERATIONS = 8
+
+# Regroupement des tokens avant publication : envoi toutes les CHAT_FLUSH_INTERVAL_MS millisecondes
+# ou dès que CHAT_FLUSH_MAX_CHARS caractères sont en attente
+CHAT_FLUSH_INTERVAL_MS = 30
+CHAT_FLUSH_MAX_CHARS = 64
+
+# Cache des réponses pour les questions répétées : nombre maximal de réponses (0 pour le désactiver),
+# durée de vie (en secondes) et similarité cosinus minimale entre deux questions
+ANSWER_CACHE_MAX_ENTRIES = 256
+ANSWER_CACHE_TTL = 3600
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+
 # Modèle de pre-prompts pour les questions, le contexte correpond aux documents similaires trouvés
 # et la question est la question posée par l'utilisateur
 PROMPT_TEMPLATE = """
@@ -152,3 +274,22 @@ Answer the question based only on the following context:
 
 Answer the question based on the above context: {question}
 """
+
+# Proportion des prompts journalisés (niveau DEBUG du logger "rag") et taille maximale journalisée (en caractères)
+PROMPT_LOG_SAMPLE_RATE = 0.05
+PROMPT_LOG_MAX_CHARS = 2000
+
+# Journalisation sur la console ; le niveau du logger "rag" est donné par la variable d'environnement RAG_LOG_LEVEL
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "rag": {
+            "handlers": ["console"],
+            "level": os.environ.get("RAG_LOG_LEVEL", "INFO"),
+        },
+    },
+}